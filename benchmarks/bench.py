@@ -0,0 +1,302 @@
+"""Benchmark git_job_log on synthetic job logs, offline.
+
+usage: bench.py [-h] [--jobs JOBS] [--depth DEPTH] [--commits COMMITS]
+                [--runs-per-commit RUNS_PER_COMMIT] [--payload PAYLOAD]
+                [--width WIDTH] [--diamonds DIAMONDS] [--repeat REPEAT]
+                [--seed SEED] [--plot] [--workdir WORKDIR] [--compare COMPARE]
+
+Generates a local bare remote with `git fast-import` (jobs spread over a
+hierarchy of depth words, every job run once then commits-1 commits of
+runs-per-commit random runs, payload bytes of data each) and a random job DAG
+(layers of width jobs, each with a parent in the previous layer and a second
+parent, forming diamonds, with probability diamonds).  Times each operation and
+writes one JSON line per operation to stdout, e.g.
+
+    python benchmarks/bench.py --jobs 5000 --commits 20000 > after.jsonl
+    python benchmarks/bench.py --jobs 5000 --commits 20000 --compare before.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from git_job_log import GitJobLog, graph_jobs
+
+COMMIT_INTERVAL = 60  # seconds between synthetic commits
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Make command line parser."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--jobs", type=int, default=1000, help="Number of jobs.")
+    parser.add_argument("--depth", type=int, default=4, help="Words per job ID.")
+    parser.add_argument("--commits", type=int, default=2000, help="Commits.")
+    parser.add_argument(
+        "--runs-per-commit", type=int, default=5, help="Jobs run in each commit."
+    )
+    parser.add_argument("--payload", type=int, default=100, help="Bytes per run.")
+    parser.add_argument("--width", type=int, default=50, help="Jobs per DAG layer.")
+    parser.add_argument(
+        "--diamonds", type=float, default=0.3, help="Chance of a second parent."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Times per operation.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    parser.add_argument(
+        "--plot", action="store_true", default=False, help="Time full make_plot()."
+    )
+    parser.add_argument(
+        "--workdir", type=str, help="Directory for repos, default a temp. dir."
+    )
+    parser.add_argument(
+        "--compare", type=str, help="Compare with JSON lines from a previous run."
+    )
+    return parser
+
+
+def job_ids(jobs: int, depth: int, fan: int = 8) -> list[str]:
+    """Hierarchical job IDs, depth words, fan children per prefix."""
+    ids = []
+    for job_i in range(jobs):
+        words, rest = [], job_i
+        for _ in range(depth - 1):
+            words.append(f"g{rest % fan}")
+            rest //= fan
+        ids.append("/".join([*reversed(words), f"job{job_i}"]))
+    return ids
+
+
+def make_remote(path: Path, jobs: list[str], opt, rng: random.Random) -> None:
+    """Bare repo at path with opt.commits commits of runs of jobs."""
+    subprocess.run(["git", "init", "--bare", "-q", path], check=True)  # noqa:S603,S607
+    proc = subprocess.Popen(  # noqa:S603
+        ["git", "-C", path, "fast-import", "--quiet"],  # noqa:S607
+        stdin=subprocess.PIPE,
+    )
+    start = int(time.time()) - opt.commits * COMMIT_INTERVAL
+    for commit_i in range(opt.commits):
+        ran = jobs if commit_i == 0 else rng.sample(jobs, opt.runs_per_commit)
+        message = f"ran: {', '.join(ran[:10])}".encode()
+        lines = [
+            b"commit refs/heads/job_logs",
+            f"mark :{commit_i + 1}".encode(),
+            b"committer Bench <bench@localhost> %d +0000"
+            % (start + commit_i * COMMIT_INTERVAL),
+            b"data %d" % len(message),
+            message,
+        ]
+        if commit_i:
+            lines.append(f"from :{commit_i}".encode())
+        for job in ran:
+            data = f"commit: {commit_i}\nfill: {'x' * opt.payload}\n".encode()
+            lines.append(f"M 100644 inline {job}/RUN".encode())
+            lines.extend([b"data %d" % len(data), data])
+        proc.stdin.write(b"\n".join(lines) + b"\n\n")
+    proc.stdin.close()
+    if proc.wait():
+        raise Exception("git fast-import failed")
+    cmd = ["git", "-C", path, "symbolic-ref", "HEAD", "refs/heads/job_logs"]
+    subprocess.run(cmd, check=True)  # noqa:S603
+
+
+def random_dag(jobs: list[str], width: int, diamonds: float, rng) -> list[tuple]:
+    """Edges for layers of width jobs, each with 1 or 2 parents in the layer above."""
+    edges = []
+    layers = [jobs[i : i + width] for i in range(0, len(jobs), width)]
+    for above, layer in itertools.pairwise(layers):
+        for job in layer:
+            parents = rng.sample(above, 2 if rng.random() < diamonds else 1)
+            edges.extend((parent, job) for parent in parents)
+    return edges
+
+
+def timed(repeat: int, func, setup=None) -> list[float]:
+    """Seconds for repeat calls of func, setup (untimed) before each."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(opt, workdir: Path) -> list[dict]:
+    """Generate data, time operations."""
+    rng = random.Random(opt.seed)
+    jobs = job_ids(opt.jobs, opt.depth)
+    remote = workdir / "remote"
+    start = time.perf_counter()
+    make_remote(remote, jobs, opt, rng)
+    results = {"generate": [time.perf_counter() - start]}
+    depends = random_dag(jobs, opt.width, opt.diamonds, rng)
+    os.chdir(workdir)  # Local clones are made in the current directory.
+
+    def fresh_clone():
+        shutil.rmtree(workdir / ".git_job_log", ignore_errors=True)
+
+    results["clone"] = timed(opt.repeat, lambda: GitJobLog(remote), fresh_clone)
+    gjl = GitJobLog(remote)
+    results["last_runs_cold"] = timed(
+        opt.repeat, gjl.last_runs, lambda: gjl.index_path().unlink(missing_ok=True)
+    )
+    results["last_runs"] = timed(opt.repeat, gjl.last_runs)
+    results["last_ran"] = timed(opt.repeat, lambda: gjl.last_ran(rng.choice(jobs)))
+    results["run_history"] = timed(
+        opt.repeat,
+        lambda: [run.data for run in gjl.run_history(rng.choice(jobs))],
+    )
+
+    def next_second():
+        """Run times have 1s resolution, a job can't be logged twice a second."""
+        time.sleep(1 - time.time() % 1)
+
+    results["log_run"] = timed(
+        opt.repeat,
+        lambda: gjl.log_run([rng.choice(jobs)], {"seed": rng.random()}),
+        next_second,
+    )
+
+    def log_batch():
+        with gjl.batch():
+            done = [gjl.log_run([job], {"seed": rng.random()}) for job in jobs[:100]]
+        for future in done:
+            future.result()
+
+    results["log_run_batch_100"] = timed(opt.repeat, log_batch, next_second)
+
+    graph = None
+
+    def make_graph():
+        nonlocal graph
+        graph = graph_jobs.make_graph(depends)
+
+    results["make_graph"] = timed(opt.repeat, make_graph)
+    results["add_status"] = timed(opt.repeat, lambda: graph_jobs.add_status(graph, gjl))
+    description = {tuple(job.split("/")[:2]): job for job in jobs[:: opt.width]}
+    results["annotate_graph"] = timed(
+        opt.repeat, lambda: graph_jobs.annotate_graph(graph, description)
+    )
+    results["cluster_graph"] = timed(
+        opt.repeat, lambda: graph_jobs.cluster_graph(graph, depth=2)
+    )
+    results["squash_graph"] = timed(
+        opt.repeat, lambda: graph_jobs.squash_graph(graph), make_graph
+    )
+    gjl.close()
+
+    try:
+        import pygraphviz  # noqa:F401,PLC0415 - optional, plot extra
+    except ImportError:
+        print("pygraphviz not installed, not timing make_plot()", file=sys.stderr)
+    else:
+        make_graph()
+        graph_jobs.add_status(graph, gjl)
+        graph_jobs.annotate_graph(graph)
+        clustered = graph_jobs.cluster_graph(graph, depth=2)
+        results["make_plot_clustered"] = timed(
+            opt.repeat,
+            lambda: graph_jobs.make_plot(clustered, workdir / "clustered.svg"),
+        )
+        if opt.plot:
+            results["make_plot"] = timed(
+                opt.repeat, lambda: graph_jobs.make_plot(graph, workdir / "all.svg")
+            )
+
+    params = {
+        k: getattr(opt, k)
+        for k in (
+            "jobs",
+            "depth",
+            "commits",
+            "runs_per_commit",
+            "payload",
+            "width",
+            "diamonds",
+            "seed",
+        )
+    }
+    info = {
+        "source": source_version(),
+        "python": platform.python_version(),
+        "when": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+    }
+    return [
+        {
+            "benchmark": name,
+            "min": min(times),
+            "median": statistics.median(times),
+            "repeat": len(times),
+            **params,
+            **info,
+        }
+        for name, times in results.items()
+    ]
+
+
+def source_version() -> str:
+    """git describe of the git_job_log source being benchmarked, if available."""
+    proc = subprocess.run(
+        ["git", "-C", Path(__file__).parent, "describe", "--always", "--dirty"],  # noqa:S607
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return proc.stdout.strip() or "unknown"
+
+
+def compare(results: list[dict], path: str) -> None:
+    """Print min times of results vs. those in a previous JSON lines file."""
+    with Path(path).open() as lines:
+        before = [json.loads(line) for line in lines if line.strip()]
+    before = {i["benchmark"]: i for i in before}
+    header = f"{'benchmark':24} {'before':>10} {'after':>10} {'ratio':>7}"
+    print(header, file=sys.stderr)
+    for result in results:
+        old = before.get(result["benchmark"])
+        if old is None:
+            continue
+        ratio = result["min"] / old["min"] if old["min"] else float("nan")
+        print(
+            f"{result['benchmark']:24} {old['min']:10.4f} {result['min']:10.4f} "
+            f"{ratio:7.2f}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: list[str]) -> None:
+    """Run benchmarks, JSON lines to stdout."""
+    opt = make_parser().parse_args(argv)
+    cwd = Path.cwd()
+    try:
+        if opt.workdir:
+            workdir = Path(opt.workdir).resolve()
+            workdir.mkdir(parents=True, exist_ok=True)
+            results = run_benchmarks(opt, workdir)
+        else:
+            with tempfile.TemporaryDirectory(prefix="git_job_log_bench") as tmp:
+                results = run_benchmarks(opt, Path(tmp))
+                os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+    for result in results:
+        print(json.dumps(result))
+    if opt.compare:
+        compare(results, opt.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,5 +1,52 @@
 """git_job_log exports."""
-from .git_job_log import GitJobLog, LastRun
-from . import graph_jobs
+from .git_job_log import (
+    CmdEvent,
+    GitJobLog,
+    JobLogBackend,
+    LastRun,
+    LockTimeout,
+    MetricsSink,
+    PastRun,
+)
 
-__all__ = ["GitJobLog", "LastRun", "graph_jobs"]
+__all__ = [
+    "AsyncGitJobLog",
+    "CmdEvent",
+    "GitJobLog",
+    "JobLogBackend",
+    "LastRun",
+    "LockTimeout",
+    "MemoryJobLog",
+    "MetricsSink",
+    "PastRun",
+    "SqliteJobLog",
+    "graph_jobs",
+    "open_job_log",
+]
+
+# Loaded on first use, so logging runs doesn't pay for asyncio / graph code.
+_LAZY = {
+    "AsyncGitJobLog": (".async_git_job_log", "AsyncGitJobLog"),
+    "MemoryJobLog": (".backends", "MemoryJobLog"),
+    "SqliteJobLog": (".backends", "SqliteJobLog"),
+    "graph_jobs": (".graph_jobs", None),
+    "open_job_log": (".backends", "open_job_log"),
+}
+
+
+def __getattr__(name: str):
+    """Import _LAZY names when first accessed."""
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib  # noqa:PLC0415
+
+    module_name, attr = _LAZY[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """Include lazily loaded names."""
+    return sorted([*globals(), *_LAZY])
@@ -0,0 +1,284 @@
+"""asyncio counterpart of GitJobLog.
+
+    async with AsyncGitJobLog() as gjl:
+        await gjl.log_run(["home/yard/fence/paint"])
+        job_ran = await gjl.last_runs()
+
+git commands are run with asyncio.create_subprocess_exec, no more than
+max_concurrency at once, so the event loop isn't blocked.  Independent reads run
+concurrently and concurrent pull()s share a single in-flight fetch.
+
+Uses the same local clone, lock, and last run index as GitJobLog, so the two can
+be used side by side.
+"""
+
+import asyncio
+import contextvars
+import fcntl
+import os
+import subprocess
+import time
+from collections.abc import AsyncIterator, Callable, Generator
+from contextlib import aclosing, asynccontextmanager
+from pathlib import Path
+from typing import Self
+
+from git_job_log.git_job_log import (
+    LOCK_POLL,
+    GitJobLog,
+    JobType,
+    LastRun,
+    _Cmd,
+    _Exclusive,
+    _FetchLocked,
+    _Gather,
+    _job_ids,
+    _operation,
+    _parse_cat_file,
+    _ReadObjects,
+    _run_message,
+    _Sleep,
+    _Stream,
+)
+
+
+class AsyncGitJobLog:
+    """Manage logging job runs to a git repo. from asyncio code."""
+
+    def __init__(
+        self,
+        remote: Path | None = None,  # repo. URL +/- token or None for auto-discovery
+        silent: bool = not os.environ.get("GIT_JOB_LOG_DEBUG", "").strip(),
+        max_staleness: float | None = None,  # seconds reads may skip fetching for
+        max_push_retries: int = 10,  # re-applies of a log_run() on rejected push
+        lock_timeout: float = 60,  # seconds to wait for other users of local clone
+        max_concurrency: int = 8,  # git processes run at once
+        on_command: Callable | None = None,  # called with a CmdEvent per git command
+    ):
+        """Bind to a repository.
+
+        This blocks if the remote needs cloning, so create at startup.
+        """
+        self.gjl = GitJobLog(
+            remote,
+            silent=silent,
+            max_staleness=max_staleness,
+            max_push_retries=max_push_retries,
+            lock_timeout=lock_timeout,
+            on_command=on_command,
+        )
+        self.local = self.gjl.local
+        self.push_stats = self.gjl.push_stats
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._fetching = None
+        self._held = contextvars.ContextVar("held", default=None)
+
+    async def __aenter__(self) -> Self:
+        """Use as an async context manager to close helper processes afterwards."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close helper processes."""
+        self.gjl.close()
+
+    async def _run(
+        self, cmd: list[str | Path], input: str | bytes | None = None
+    ) -> subprocess.CompletedProcess:
+        """Run a command returning the CompletedProcess, stdout as bytes."""
+        cmd = [str(i) for i in cmd]
+        if isinstance(input, str):
+            input = input.encode("utf8")
+        if not self.gjl.silent:
+            print(cmd)
+        async with self._limit:
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=self.gjl._git_env(),
+            )
+            out, err = await proc.communicate(input)
+        self.gjl._emit(cmd, start, proc.returncode, len(out), len(err))
+        if err and not self.gjl.silent:
+            print(err.decode("utf8"))
+        return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+
+    async def _stream_cmd(self, cmd: list[str | Path]) -> AsyncIterator[str]:
+        """Run a command yielding stdout lines as they arrive.
+
+        The process is killed if the caller stops iterating early, use with
+        contextlib.aclosing() so that happens promptly.
+        """
+        cmd = [str(i) for i in cmd]
+        if not self.gjl.silent:
+            print(cmd)
+        async with self._limit:
+            start, size = time.perf_counter(), 0
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL if self.gjl.silent else None,
+                env=self.gjl._git_env(),
+            )
+            finished = False
+            try:
+                async for line in proc.stdout:
+                    size += len(line)
+                    yield line.decode("utf8").rstrip("\n")
+                finished = True
+            finally:
+                if not finished and proc.returncode is None:
+                    proc.kill()
+                await proc.wait()
+                returncode = proc.returncode if finished else None
+                self.gjl._emit(cmd, start, returncode, size, 0)
+
+    async def _read_objects(self, objects: list[str]) -> dict:
+        """Map object name -> bytes, None if missing, with one `git cat-file`."""
+        if not objects:
+            return {}
+        proc = await self._run(
+            ["git", "-C", self.local, "cat-file", "--batch"],
+            input="".join(f"{i}\n" for i in objects),
+        )
+        return _parse_cat_file(objects, proc.stdout)
+
+    async def _drive(self, steps: Generator):
+        """Do the I/O a GitJobLog *_steps() generator asks for, return its result."""
+        result = None
+        while True:
+            try:
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = await self._step(step)
+
+    async def _step(self, step: tuple):
+        """Do one step's I/O, see GitJobLog._step()."""
+        if isinstance(step, _Cmd):
+            return await self._run(step.argv, input=step.input)
+        if isinstance(step, _Stream):
+            async with aclosing(self._stream_cmd(step.argv)) as lines:
+                async for line in lines:
+                    if step.feed(line):
+                        break
+            return None
+        if isinstance(step, _ReadObjects):
+            return await self._read_objects(step.objects)
+        if isinstance(step, _Gather):
+            return list(await asyncio.gather(*(self._drive(i) for i in step.steps)))
+        if isinstance(step, _Sleep):
+            await asyncio.sleep(step.seconds)
+            return None
+        if isinstance(step, _Exclusive):
+            async with self._lock(exclusive=True):
+                return await self._drive(step.steps)
+        if isinstance(step, _FetchLocked):
+            async with self._flock(self.gjl.fetch_lock_path(), exclusive=True):
+                return await self._drive(step.steps)
+        raise TypeError(f"Unknown step {step!r}")
+
+    @_operation
+    async def pull(self, force: bool = False) -> None:
+        """Sync. with the remote, see GitJobLog.pull().
+
+        Concurrent non-forced pulls share one in-flight fetch.
+        """
+        if force:
+            await self._fetch()
+            return
+        if self.gjl._recently_fetched():
+            return
+        if self._fetching is None:
+            self._fetching = asyncio.ensure_future(self._fetch(force=False))
+            self._fetching.add_done_callback(self._fetched)
+        await asyncio.shield(self._fetching)
+
+    def _fetched(self, _task: asyncio.Future) -> None:
+        """Let the next pull() start a new fetch."""
+        self._fetching = None
+
+    async def _fetch(self, force: bool = True) -> None:
+        """Fetch the job log branch and point the local branch at it.
+
+        Unless force, skipped if another process fetched while waiting for the lock.
+        """
+        started = self.gjl._fetch_generation()
+        async with self._lock(exclusive=True):
+            if not force and self.gjl._fetch_generation() != started:
+                return
+            await self._drive(self.gjl._fetch_steps())
+
+    @asynccontextmanager
+    async def _lock(self, exclusive: bool) -> AsyncIterator:
+        """The GitJobLog lock on the local clone, waited for without blocking.
+
+        Re-entrant within a task (and tasks it starts).
+        """
+        held = self._held.get()
+        if held == "exclusive" or (held == "shared" and not exclusive):
+            yield
+            return
+        if held == "shared":
+            raise Exception("Can't upgrade a shared lock to exclusive")
+        mode = "exclusive" if exclusive else "shared"
+        async with self._flock(self.gjl.lock_path(), exclusive):
+            token = self._held.set(mode)
+            try:
+                yield
+            finally:
+                self._held.reset(token)
+
+    @asynccontextmanager
+    async def _flock(self, path: Path, exclusive: bool) -> AsyncIterator:
+        """flock() path, waited for without blocking, see GitJobLog._flock()."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        deadline = time.monotonic() + self.gjl.lock_timeout
+        with path.open("a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, flags)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        raise self.gjl._lock_timeout(exclusive, path) from None
+                    await asyncio.sleep(LOCK_POLL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @_operation
+    async def log_run(
+        self, jobs: list[JobType], data: dict | str | None = None
+    ) -> None:
+        """Log running of listed jobs, see GitJobLog.log_run()."""
+        runs = [(_job_ids(jobs), data)]
+        await self._drive(self.gjl._push_steps(runs, _run_message(runs)))
+
+    @_operation
+    async def last_ran(self, job: JobType, with_data: bool = True) -> LastRun:
+        """LastRun info. for this job, data None unless with_data."""
+        await self.pull()
+        async with self._lock(exclusive=False):
+            return await self._drive(self.gjl._last_ran_steps(job, with_data))
+
+    @_operation
+    async def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """Last runs of all jobs, or a selection, see GitJobLog.last_runs()."""
+        await self.pull()
+        async with self._lock(exclusive=False):
+            return await self._drive(self.gjl._select_steps(prefix, select, with_data))
+
+    @_operation
+    async def run_index(self, pathspec: list[str] | None = None) -> dict:
+        """Map job -> (last run datetime, RUN blob id), see GitJobLog.run_index()."""
+        return await self._drive(self.gjl._index_steps(pathspec))
@@ -0,0 +1,252 @@
+"""JobLogBackends other than GitJobLog.
+
+MemoryJobLog keeps runs in a dict, for tests and simulations.  SqliteJobLog keeps
+them in a SQLite database, for a single site logging many runs a minute without
+a git remote.  Both store RUN data as GitJobLog does, so the same data reads back
+the same way, but run times have sub-second resolution and logging a job twice
+in a second is fine.
+
+    with open_job_log("sqlite:job_log.db") as job_log:
+        job_log.log_run(["home/yard/fence/paint"], {"color": "green"})
+"""
+
+import sqlite3
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+from git_job_log.git_job_log import (
+    GitJobLog,
+    JobLogBackend,
+    JobType,
+    LastRun,
+    PastRun,
+    _decode,
+    _encode,
+    _select_jobs,
+)
+
+
+def open_job_log(remote: str | Path | None = None, **kwargs) -> JobLogBackend:
+    """JobLogBackend for remote.
+
+    "memory:" is a new MemoryJobLog, "sqlite:PATH" a SqliteJobLog on PATH, and
+    anything else (including None, for auto-discovery) a GitJobLog with kwargs.
+    """
+    if remote == "memory:":
+        return MemoryJobLog()
+    if isinstance(remote, str) and remote.startswith("sqlite:"):
+        return SqliteJobLog(remote.removeprefix("sqlite:"), **kwargs)
+    return GitJobLog(remote, **kwargs)
+
+
+class MemoryJobLog(JobLogBackend):
+    """Job runs in memory, lost when this is."""
+
+    def __init__(self):
+        """Start empty."""
+        self._runs = {}  # job -> [(run ID, when, RUN text), ...] oldest first
+        self._count = 0
+        self._mutex = threading.Lock()
+
+    def log_run(self, jobs: list[JobType], data: dict | str | None = None) -> None:
+        """Log a run of jobs."""
+        text = _text(data)
+        when = datetime.now(tz=timezone.utc)
+        with self._mutex:
+            self._count += 1
+            for job in jobs:
+                run = (str(self._count), when, text)
+                self._runs.setdefault(job.strip("/"), []).append(run)
+
+    def last_ran(self, job: JobType, with_data: bool = True) -> LastRun:
+        """LastRun info. for this job, data None unless with_data."""
+        with self._mutex:
+            runs = self._runs.get(job)
+            run = runs[-1] if runs else None
+        if run is None:
+            return LastRun(None, None)
+        _, when, text = run
+        return _last_run(when, text, with_data)
+
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """{job: LastRun} for all jobs, or those under prefix / matching select."""
+        with self._mutex:
+            last = {job: runs[-1] for job, runs in self._runs.items()}
+        return {
+            job: _last_run(when, text, with_data)
+            for job, (_, when, text) in _select_jobs(last, prefix, select).items()
+        }
+
+    def run_history(
+        self,
+        job: JobType,
+        since: datetime | str | None = None,
+        until: datetime | str | None = None,
+        limit: int | None = None,
+    ) -> Iterator[PastRun]:
+        """Runs of job, newest first, since / until datetimes or ISO strings."""
+        since, until = _when(since), _when(until)
+        with self._mutex:
+            runs = list(reversed(self._runs.get(job, ())))
+        runs = [
+            (run_id, when, text)
+            for run_id, when, text in runs
+            if not ((since and when < since) or (until and when > until))
+        ]
+        for run_id, when, text in runs[:limit]:
+            yield PastRun(None, job, run_id, when, data=_decode(text))
+
+
+class SqliteJobLog(JobLogBackend):
+    """Job runs in a SQLite database, shareable by processes on one host."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        lock_timeout: float = 60,  # seconds to wait for other writers
+    ):
+        """Open, and create if needed, the database at path."""
+        self.path = path
+        self._db = sqlite3.connect(
+            path, timeout=lock_timeout, check_same_thread=False, isolation_level=None
+        )
+        self._mutex = threading.Lock()  # One connection, shared by threads.
+        with self._mutex:
+            if path != ":memory:":
+                # Readers don't block the writer, commits needn't fsync.
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    job TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS runs_job ON runs (job, id);
+                CREATE TABLE IF NOT EXISTS last_runs (
+                    job TEXT PRIMARY KEY,
+                    id INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def log_run(self, jobs: list[JobType], data: dict | str | None = None) -> None:
+        """Log a run of jobs in one transaction."""
+        text = _text(data)
+        when = datetime.now(tz=timezone.utc).isoformat()
+        with self._mutex:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for job in jobs:
+                    cursor = self._db.execute(
+                        "INSERT INTO runs (job, timestamp, data) VALUES (?, ?, ?)",
+                        (job.strip("/"), when, text),
+                    )
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO last_runs (job, id) VALUES (?, ?)",
+                        (job.strip("/"), cursor.lastrowid),
+                    )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def last_ran(self, job: JobType, with_data: bool = True) -> LastRun:
+        """LastRun info. for this job, data None unless with_data."""
+        data = "runs.data" if with_data else "''"  # Not read at all.
+        with self._mutex:
+            row = self._db.execute(
+                f"SELECT runs.timestamp, {data} FROM last_runs "
+                "JOIN runs ON runs.id = last_runs.id WHERE last_runs.job = ?",
+                (job,),
+            ).fetchone()
+        if row is None:
+            return LastRun(None, None)
+        when, text = row
+        return _last_run(datetime.fromisoformat(when), text, with_data)
+
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """{job: LastRun} for all jobs, or those under prefix / matching select."""
+        data = "runs.data" if with_data else "''"  # Not read at all.
+        query = (
+            f"SELECT last_runs.job, runs.timestamp, {data} FROM last_runs "
+            "JOIN runs ON runs.id = last_runs.id"
+        )
+        prefix = (prefix or "").strip("/")
+        params = ()
+        if prefix:
+            # Not LIKE, job IDs may contain % or _.
+            query += " WHERE last_runs.job = ? OR substr(last_runs.job, 1, ?) = ?"
+            params = (prefix, len(prefix) + 1, f"{prefix}/")
+        with self._mutex:
+            rows = self._db.execute(query, params).fetchall()
+        last = {job: (when, text) for job, when, text in rows}
+        return {
+            job: _last_run(datetime.fromisoformat(when), text, with_data)
+            for job, (when, text) in _select_jobs(last, None, select).items()
+        }
+
+    def run_history(
+        self,
+        job: JobType,
+        since: datetime | str | None = None,
+        until: datetime | str | None = None,
+        limit: int | None = None,
+    ) -> Iterator[PastRun]:
+        """Runs of job, newest first, since / until datetimes or ISO strings."""
+        query = "SELECT id, timestamp, data FROM runs WHERE job = ?"
+        params = [job]
+        for op, value in ((">=", _when(since)), ("<=", _when(until))):
+            if value is not None:
+                # Stored as UTC ISO strings, so they sort as times do.
+                query += f" AND timestamp {op} ?"
+                params.append(value.astimezone(timezone.utc).isoformat())
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._mutex:
+            rows = self._db.execute(query, params).fetchall()
+        for run_id, when, text in rows:
+            yield PastRun(
+                None, job, str(run_id), datetime.fromisoformat(when), data=_decode(text)
+            )
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._mutex:
+            self._db.close()
+
+
+def _text(data: dict | str | bytes | None) -> str:
+    """RUN text for data, as GitJobLog would write it."""
+    text = _encode(data)
+    return text.decode("utf8") if isinstance(text, bytes) else text
+
+
+def _last_run(when: datetime, text: str, with_data: bool) -> LastRun:
+    """LastRun with data decoded from text, if with_data."""
+    return LastRun(timestamp=when, data=_decode(text)) if with_data else LastRun(when)
+
+
+def _when(value: datetime | str | None) -> datetime | None:
+    """since / until as a timezone aware datetime, local time if not given."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is None:
+        value = value.astimezone()
+    return value
@@ -1,25 +1,54 @@
 """Command line for git_job_log.
 
-usage: cli.py [-h] [--verbose] [COMMAND] [JOB(S) ...]
+usage: cli.py [-h] [--verbose] [--edit] [--since SINCE] [--until UNTIL]
+              [--limit LIMIT] [--data] [--select SELECT] [--metrics]
+              [--socket SOCKET] [--sync-interval SYNC_INTERVAL]
+              [COMMAND] [JOB(S) ...]
 
 positional arguments:
-  COMMAND     Mode: list, log (default: list)
-  JOB(S)      Job IDs: e.g. 'work/commute/pass/renew' (default: None)
+  COMMAND               Mode: list, log, history, serve (default: list)
+  JOB(S)                Job IDs: e.g. 'work/commute/pass/renew', for list a
+                        prefix, e.g. 'work/commute' (default: None)
 
 options:
-  -h, --help  show this help message and exit
-  --verbose   Show git commands and responses. (default: False)
+  -h, --help            show this help message and exit
+  --verbose             Show git commands and responses. (default: False)
+  --edit                Allow user to edit commit log. (default: False)
+  --since SINCE         history: runs after this, e.g. '1 month ago' (default:
+                        None)
+  --until UNTIL         history: runs before this (default: None)
+  --limit LIMIT         history: max. runs per job (default: None)
+  --data                history: show run data (default: False)
+  --select SELECT       list: jobs matching these regex words at any depth,
+                        e.g. 'commute/pa.*' (default: None)
+  --metrics             Show git command counts and times on stderr. (default:
+                        None)
+  --socket SOCKET       Unix socket to serve on, or for list / log to use a
+                        server on, default $GIT_JOB_LOG_SOCKET (default: None)
+  --sync-interval SYNC_INTERVAL
+                        serve: seconds between fetches from the remote
+                        (default: 10)
 """
 
 import argparse
+import os
 import sys
+from pathlib import Path
 
-from git_job_log import GitJobLog
+if not __package__:  # Run as cli.py, import the package, not git_job_log.py
+    sys.path[0] = str(Path(__file__).resolve().parents[1])
 
+from git_job_log import GitJobLog, MetricsSink  # noqa:E402
+from git_job_log.util import split_job  # noqa:E402
 
-def _build_GitJobLog(opt):
-    """Tweak silent flag etc."""
-    gjl = GitJobLog()
+
+def _build_GitJobLog(opt, served: bool = False):
+    """Tweak silent flag etc., a JobLogClient if served and there's a socket."""
+    if served and opt.socket and not opt.edit and not opt.metrics:
+        from git_job_log.serve import JobLogClient  # noqa:PLC0415 - only when serving
+
+        return JobLogClient(opt.socket)
+    gjl = GitJobLog(on_command=opt.metrics)
     if opt.verbose:
         gjl.silent = False
     return gjl
@@ -36,14 +65,15 @@ def make_parser() -> argparse.ArgumentParser:
         default="list",
         nargs="?",
         metavar="COMMAND",
-        help="Mode: list, log",
+        help="Mode: list, log, history, serve",
     )
     parser.add_argument(
         "job",
         type=str,
         nargs="*",
         metavar="JOB(S)",
-        help="Job IDs: e.g. 'work/commute/pass/renew'",
+        help="Job IDs: e.g. 'work/commute/pass/renew', for list a prefix, "
+        "e.g. 'work/commute'",
     )
     parser.add_argument(
         "--verbose",
@@ -57,27 +87,114 @@ def make_parser() -> argparse.ArgumentParser:
         default=False,
         help="Allow user to edit commit log.",
     )
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="history: runs after this, e.g. '1 month ago'",
+    )
+    parser.add_argument(
+        "--until",
+        type=str,
+        help="history: runs before this",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="history: max. runs per job",
+    )
+    parser.add_argument(
+        "--data",
+        action="store_true",
+        default=False,
+        help="history: show run data",
+    )
+    parser.add_argument(
+        "--select",
+        type=str,
+        help="list: jobs matching these regex words at any depth, e.g. 'commute/pa.*'",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_const",
+        const=MetricsSink(),
+        default=None,
+        help="Show git command counts and times on stderr.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=os.environ.get("GIT_JOB_LOG_SOCKET", "").strip() or None,
+        help="Unix socket to serve on, or for list / log to use a server on, "
+        "default $GIT_JOB_LOG_SOCKET",
+    )
+    parser.add_argument(
+        "--sync-interval",
+        type=float,
+        default=10,
+        help="serve: seconds between fetches from the remote",
+    )
     return parser
 
 
 def list_last_runs(opt):
-    """List the last runs of all jobs."""
-    gjl = _build_GitJobLog(opt)
-    for job, run in gjl.last_runs().items():
-        print(run.timestamp, job)
+    """List the last runs of all jobs, or those under prefixes / --select."""
+    gjl = _build_GitJobLog(opt, served=True)
+    select = split_job(opt.select) if opt.select else None
+    for prefix in opt.job or [None]:
+        for job, run in gjl.last_runs(prefix, select, with_data=False).items():
+            print(run.timestamp, job)
 
 
 def log_run(opt):
     """Log a successful run of the job(s) listed on the commandline."""
+    gjl = _build_GitJobLog(opt, served=True)
+    if opt.edit:
+        gjl.log_run(opt.job, edit=True)
+    else:
+        gjl.log_run(opt.job)
+
+
+def run_history(opt):
+    """List past runs of the job(s) listed on the commandline, newest first."""
     gjl = _build_GitJobLog(opt)
-    gjl.log_run(opt.job, edit=opt.edit)
+    for job in opt.job:
+        for run in gjl.run_history(job, opt.since, opt.until, opt.limit):
+            print(run.timestamp, run.commit, job)
+            if opt.data and run.data:
+                print(f"    {run.data}")
+
+
+def serve(opt):
+    """Serve list / log requests on a Unix socket until interrupted."""
+    from git_job_log.serve import JobLogServer  # noqa:PLC0415 - only when serving
+
+    if not opt.socket:
+        raise Exception("serve needs --socket or GIT_JOB_LOG_SOCKET")
+    server = JobLogServer(
+        opt.socket, _build_GitJobLog(opt), sync_interval=opt.sync_interval
+    )
+    print(f"Serving on {opt.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
 
 
 DISPATCH = {
     "list": list_last_runs,
     "log": log_run,
+    "history": run_history,
+    "serve": serve,
 }
 
-if __name__ == "__main__":
-    opt = make_parser().parse_args(sys.argv[1:])
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the command line."""
+    opt = make_parser().parse_args(sys.argv[1:] if argv is None else argv)
     DISPATCH[opt.command](opt)
+    if opt.metrics:
+        print(opt.metrics.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,41 +25,388 @@ returns a `{job_id0: RunLog, job_id1: RunLog, ...}` mapping for all jobs.
 GIT_RUN_LOG_REPO needs to be set and can be set in .env
 """
 
+import bisect
+import fcntl
+import functools
 import hashlib
+import json
+import math
 import os
+import random
+import re
 import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import Future
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import NamedTuple
+from typing import NamedTuple, Self
 
-import yaml
-from dotenv import load_dotenv
+from git_job_log.util import REGEX_CHARS, job_match
 
 GIT_JOB_LOG_DATA_DIR = ".git_job_log"
 GIT_JOB_LOG_RUN_FILE = "RUN"
 GIT_JOB_LOG_BRANCH = "job_logs"
+# Job -> last run index, kept inside the local clone's .git so it's never committed.
+GIT_JOB_LOG_INDEX_FILE = "git_job_log_index.json"
+# `git log` format for _HistoryScan, \0 marks commit lines amongst --name-only paths.
+HISTORY_FORMAT = "--format=%x00%H %cI"
+OBJECT_ID = re.compile("[0-9a-f]{40}|[0-9a-f]{64}")  # SHA-1 or SHA-256
+# Selections of up to this many jobs are passed to `rev-list` as paths.
+PREFETCH_PATHS = 256
+LOCK_POLL = 0.05  # seconds between attempts to get the local clone lock
+# git push stderr when another writer got there first, worth re-applying for.
+PUSH_REJECTED = ("(fetch first)", "(non-fast-forward)", "cannot lock ref")
+# Push retry backoff, seconds, doubled each retry up to max, +/- 50% jitter.
+PUSH_BACKOFF = 0.2
+PUSH_BACKOFF_MAX = 5.0
+# Upper bounds, seconds, of MetricsSink histogram buckets, the last is open.
+METRICS_BUCKETS = (0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0)
 
 
 JobType = str
+_UNREAD = object()  # PastRun.data not read yet.
+# Outermost public GitJobLog method running, for CmdEvents.
+_OPERATION = ContextVar("git_job_log_operation", default=None)
 
 
 class LastRun(NamedTuple):
     """Last run information for a job."""
 
     timestamp: datetime | None
-    data: str | dict | None
+    data: str | dict | None = None
 
 
-class GitJobLog:
+class PastRun:
+    """A run of a job from run_history(), data is read when first accessed."""
+
+    __slots__ = ("_data", "_gjl", "commit", "job", "timestamp")
+
+    def __init__(
+        self,
+        gjl: "JobLogBackend | None",
+        job: JobType,
+        commit: str,
+        when: datetime,
+        data=_UNREAD,  # or read later with gjl.data_at(job, commit)
+    ):
+        """Run of job logged by commit (or other run ID) at when."""
+        self._gjl = gjl
+        self._data = data
+        self.job = job
+        self.commit = commit
+        self.timestamp = when
+
+    @property
+    def data(self) -> str | dict | None:
+        """RUN data logged by this run."""
+        if self._data is _UNREAD:
+            self._data = self._gjl.data_at(self.job, self.commit)
+        return self._data
+
+    def __repr__(self) -> str:
+        """Without data, which would have to be read."""
+        return f"PastRun({self.job!r}, {self.commit[:12]}, {self.timestamp})"
+
+
+class LockTimeout(TimeoutError):
+    """Timed out waiting for another process using the same local clone."""
+
+
+class CmdEvent(NamedTuple):
+    """A git command run by GitJobLog."""
+
+    argv: list[str]
+    seconds: float
+    returncode: int | None  # None for long-lived processes / output not all read.
+    stdout_bytes: int
+    stderr_bytes: int
+    operation: str | None  # Outermost public GitJobLog method running.
+
+    @property
+    def command(self) -> str:
+        """git sub-command, e.g. "push", skipping global options."""
+        return _git_subcommand(self.argv)
+
+
+def _git_subcommand(argv: list[str]) -> str:
+    """First non-option argument after `git`, argv[0] if not a git command."""
+    if not argv or argv[0] != "git":
+        return argv[0] if argv else ""
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in ("-C", "-c"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return "git"
+
+
+def _current_operation() -> str | None:
+    """Public operation the current thread / task is running."""
+    return _OPERATION.get()
+
+
+@contextmanager
+def _operation_scope(name: str):
+    """Attribute commands to operation name, unless already in an operation."""
+    token = _OPERATION.set(_OPERATION.get() or name)
+    try:
+        yield
+    finally:
+        _OPERATION.reset(token)
+
+
+def _operation(func: Callable) -> Callable:
+    """Decorate a public method so commands it runs are attributed to it.
+
+    Handles plain, generator and coroutine functions.
+    """
+    name = func.__name__
+
+    # inspect.CO_COROUTINE / CO_GENERATOR, inspect itself is slow to import.
+    if func.__code__.co_flags & 0x80:
+
+        @functools.wraps(func)
+        async def run_async(*args, **kwargs):
+            with _operation_scope(name):
+                return await func(*args, **kwargs)
+
+        return run_async
+
+    if func.__code__.co_flags & 0x20:
+
+        @functools.wraps(func)
+        def run_generator(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    # Only while the generator runs, not while the caller does.
+                    with _operation_scope(name):
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            return
+                    yield item
+            finally:
+                gen.close()
+
+        return run_generator
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with _operation_scope(name):
+            return func(*args, **kwargs)
+
+    return run
+
+
+# GitJobLog's git logic is written as generators, the *_steps() methods, which
+# yield the I/O they need as the steps below and are sent back the results.
+# GitJobLog._drive() does the I/O with subprocess, AsyncGitJobLog's with asyncio,
+# so the two only differ in how they run commands.
+
+
+class _Cmd(NamedTuple):
+    """Run argv, result is a subprocess.CompletedProcess, stdout / stderr bytes."""
+
+    argv: list[str | Path]
+    input: str | bytes | None = None
+
+
+class _Stream(NamedTuple):
+    """Run argv, passing stdout lines to feed() until it returns True."""
+
+    argv: list[str | Path]
+    feed: Callable
+
+
+class _ReadObjects(NamedTuple):
+    """Read objects, result maps object name -> bytes, None if missing."""
+
+    objects: list[str]
+
+
+class _Gather(NamedTuple):
+    """Run *_steps() generators, concurrently if possible, result is a list."""
+
+    steps: list[Generator]
+
+
+class _Sleep(NamedTuple):
+    """Wait seconds."""
+
+    seconds: float
+
+
+class _Exclusive(NamedTuple):
+    """Run a *_steps() generator holding the exclusive lock, result is its result."""
+
+    steps: Generator
+
+
+class _FetchLocked(NamedTuple):
+    """Run a *_steps() generator holding the fetch lock, result is its result.
+
+    Readers fetch objects under the shared lock, this keeps them to one at a time.
+    """
+
+    steps: Generator
+
+
+class MetricsSink:
+    """on_command callback aggregating CmdEvents by (operation, git command).
+
+    Keeps counts, failures, seconds, output bytes and a histogram of seconds
+    (METRICS_BUCKETS), thread safe.
+    """
+
+    def __init__(self):
+        """Start empty."""
+        self.counters = defaultdict(Counter)
+        self.histograms = defaultdict(lambda: [0] * (len(METRICS_BUCKETS) + 1))
+        self.mutex = threading.Lock()
+
+    def __call__(self, event: CmdEvent) -> None:
+        """Record event."""
+        key = (event.operation or "", event.command)
+        with self.mutex:
+            counter = self.counters[key]
+            counter["calls"] += 1
+            counter["failures"] += bool(event.returncode)
+            counter["seconds"] += event.seconds
+            counter["stdout_bytes"] += event.stdout_bytes
+            counter["stderr_bytes"] += event.stderr_bytes
+            bucket = bisect.bisect_left(METRICS_BUCKETS, event.seconds)
+            self.histograms[key][bucket] += 1
+
+    def dump(self) -> list[dict]:
+        """Aggregates as a list of dicts, JSON serializable."""
+        with self.mutex:
+            return [
+                {
+                    "operation": key[0],
+                    "command": key[1],
+                    **self.counters[key],
+                    "histogram": dict(
+                        zip([*map(str, METRICS_BUCKETS), "inf"], self.histograms[key])
+                    ),
+                }
+                for key in sorted(self.counters)
+            ]
+
+    def report(self) -> str:
+        """Aggregates as a text table, slowest first."""
+        header = (
+            f"{'operation':20} {'command':14} {'calls':>6} {'fails':>5} "
+            f"{'seconds':>9} {'stdout':>10} {'stderr':>8}"
+        )
+        lines = [header]
+        for item in sorted(self.dump(), key=lambda i: -i["seconds"]):
+            lines.append(
+                f"{item['operation']:20} {item['command']:14} {item['calls']:6} "
+                f"{item['failures']:5} {item['seconds']:9.3f} "
+                f"{item['stdout_bytes']:10} {item['stderr_bytes']:8}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        """dump() as JSON."""
+        return json.dumps(self.dump(), indent=2)
+
+
+class JobLogBackend(ABC):
+    """Where job runs are logged, see GitJobLog and backends.py.
+
+    graph_jobs.add_status() and other callers only use these methods.
+    """
+
+    @abstractmethod
+    def log_run(self, jobs: list[JobType], data: dict | str | None = None):
+        """Log a run of jobs, with data (YAML encoded if not str / bytes)."""
+
+    @abstractmethod
+    def last_ran(self, job: JobType, with_data: bool = True) -> LastRun:
+        """LastRun info. for this job, data None unless with_data."""
+
+    @abstractmethod
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """{job: LastRun} for all jobs, or those under prefix / matching select."""
+
+    @abstractmethod
+    def run_history(
+        self,
+        job: JobType,
+        since: datetime | str | None = None,
+        until: datetime | str | None = None,
+        limit: int | None = None,
+    ) -> Iterator[PastRun]:
+        """Runs of job, newest first."""
+
+    def close(self) -> None:
+        """Release resources, nothing by default."""
+
+    def __enter__(self) -> Self:
+        """Use as a context manager to close() afterwards."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close."""
+        self.close()
+
+
+class GitJobLog(JobLogBackend):
     """Manage logging job runs to a git repo."""
 
     def __init__(
         self,
         remote: Path | None = None,  # repo. URL +/- token or None for auto-discovery
         silent: bool = not os.environ.get("GIT_JOB_LOG_DEBUG", "").strip(),
+        max_staleness: float | None = None,  # seconds reads may skip fetching for
+        max_push_retries: int = 10,  # re-applies of a log_run() on rejected push
+        lock_timeout: float = 60,  # seconds to wait for other users of local clone
+        clone_filter: str | None = None,  # e.g. "blob:none" for a blobless clone
+        shallow_since: str | None = None,  # e.g. "1 month ago", shallow clone
+        clone_depth: int | None = None,  # commits, shallow clone
+        sparse: list[str] | None = None,  # job prefixes, only these are read
+        on_command: Callable | None = None,  # called with a CmdEvent per git command
     ):
-        """Bind to a repository."""
+        """Bind to a repository.
+
+        The clone_* / shallow_since options only affect the initial clone of the
+        remote.  Partial clones fetch the blobs reads need, and shallow clones
+        are deepened when a job's last run might be older than the local history.
+
+        With sparse, reads only index, scan history for and report jobs under
+        those prefixes, other jobs can still be logged.
+        """
         self.silent = silent
+        self.clone_filter = clone_filter
+        self.shallow_since = shallow_since
+        self.clone_depth = clone_depth
+        self.sparse = [i.strip("/") for i in sparse] if sparse else None
+        self.on_command = on_command
+        if max_staleness is None:
+            max_staleness = float(os.environ.get("GIT_JOB_LOG_MAX_STALENESS") or 0)
+        self.max_staleness = max_staleness
+        self.max_push_retries = max_push_retries
+        self.push_stats = Counter()  # pushes, rejected, retries, failures
+        self._batcher = None
+        self._cat_file = None
+        self._partial = None  # Is the local clone a partial clone, checked on use.
+        self._empty_tree = None  # Its id for the clone's object format, on use.
+        self.lock_timeout = lock_timeout
+        self._held = threading.local()  # This thread's lock on the local clone.
         if not self.silent:
             print("IMPORTANT: git warnings below are typically OK / expected.")
         if remote is None:
@@ -77,6 +424,8 @@ class GitJobLog:
         paths = [Path("."), *Path(".").parents]
         for path in paths:
             if (path / ".env").exists():
+                from dotenv import load_dotenv  # noqa:PLC0415 - slow to import
+
                 load_dotenv(path / ".env")
                 repo = os.environ.get("GIT_JOB_LOG_REPO")
                 if repo is not None:
@@ -85,24 +434,213 @@ class GitJobLog:
 
         raise Exception("Could not find .env file for GIT_JOB_LOG_REPO")
 
-    def _do_cmd(self, cmd: str | list[str | Path], capture_output: bool = True) -> str:
+    def _do_cmd(
+        self,
+        cmd: str | list[str | Path],
+        capture_output: bool = True,
+        input: str | bytes | None = None,
+    ) -> str:
         """Run a command, show feedback if not supressed."""
+        proc = self._run(cmd, capture_output=capture_output, input=input)
+        if capture_output:
+            return proc.stdout.decode("utf8")
+
+    def _run(
+        self,
+        cmd: str | list[str | Path],
+        capture_output: bool = True,
+        input: str | bytes | None = None,
+    ) -> subprocess.CompletedProcess:
+        """Run a command returning the CompletedProcess, stdout as bytes."""
         if isinstance(cmd, str):
             cmd = cmd.split()
         cmd = [str(i) for i in cmd]
+        if isinstance(input, str):
+            input = input.encode("utf8")
         if not self.silent:
             print(cmd)
-        proc = subprocess.run(cmd, capture_output=capture_output, check=False)  # noqa:S603
-        if capture_output:
-            if proc.stderr and not self.silent:
-                print(proc.stderr.decode("utf8"))
-            return proc.stdout.decode("utf8")
+        start = time.perf_counter()
+        proc = subprocess.run(  # noqa:S603
+            cmd,
+            capture_output=capture_output,
+            input=input,
+            check=False,
+            env=self._git_env(),
+        )
+        sizes = [len(i or b"") for i in (proc.stdout, proc.stderr)]
+        self._emit(cmd, start, proc.returncode, *sizes)
+        if capture_output and proc.stderr and not self.silent:
+            print(proc.stderr.decode("utf8"))
+        return proc
+
+    def _emit(
+        self,
+        cmd: list[str],
+        start: float,
+        returncode: int | None,
+        stdout_bytes: int,
+        stderr_bytes: int,
+    ) -> None:
+        """Report a command started at perf_counter() start to on_command."""
+        if self.on_command is None:
+            return
+        self.on_command(
+            CmdEvent(
+                argv=cmd,
+                seconds=time.perf_counter() - start,
+                returncode=returncode,
+                stdout_bytes=stdout_bytes,
+                stderr_bytes=stderr_bytes,
+                operation=_current_operation(),
+            )
+        )
+
+    def _stream_cmd(self, cmd: list[str | Path]) -> Iterator[str]:
+        """Run a command yielding stdout lines as they arrive.
+
+        The process is killed if the caller stops iterating early.
+        """
+        cmd = [str(i) for i in cmd]
+        if not self.silent:
+            print(cmd)
+        start, size, caller = time.perf_counter(), 0, _current_operation()
+        proc = subprocess.Popen(  # noqa:S603
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL if self.silent else None,
+            env=self._git_env(),
+        )
+        finished = False
+        try:
+            for line in proc.stdout:
+                size += len(line)
+                yield line.decode("utf8").rstrip("\n")
+            finished = True
+        finally:
+            if not finished and proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+            with _operation_scope(caller):
+                self._emit(cmd, start, proc.returncode if finished else None, size, 0)
+
+    @_operation
+    def pull(self, force: bool = False) -> None:
+        """Sync. with the remote.
+
+        Unless force is set this is skipped if the last fetch was less than
+        max_staleness seconds ago.  The time of the last fetch is FETCH_HEAD's
+        mtime, so it's shared by all processes using the local clone.  It's
+        also skipped if another process / thread fetched while this one waited
+        for the lock, so queued readers share that fetch.
+        """
+        if not force and self._recently_fetched():
+            return
+        started = self._fetch_generation()
+        with self._lock(exclusive=True):
+            if not force and self._fetch_generation() != started:
+                return
+            self._drive(self._fetch_steps())
+
+    def _fetch_steps(self) -> Generator:
+        """Fetch the job log branch and point the local branch at it.
+
+        The caller holds the exclusive lock.
+        """
+        remote_ref = f"refs/remotes/origin/{GIT_JOB_LOG_BRANCH}"
+        yield from self._cmd_steps(
+            [
+                "git",
+                "-C",
+                self.local,
+                "fetch",
+                "--no-tags",
+                "origin",
+                f"+{GIT_JOB_LOG_BRANCH}:{remote_ref}",
+            ]
+        )
+        yield from self._cmd_steps(
+            [
+                "git",
+                "-C",
+                self.local,
+                "update-ref",
+                f"refs/heads/{GIT_JOB_LOG_BRANCH}",
+                remote_ref,
+            ]
+        )
+
+    def _fetch_generation(self) -> int | None:
+        """Changes when the local clone is fetched, FETCH_HEAD's mtime."""
+        try:
+            return (self.local / ".git" / "FETCH_HEAD").stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _recently_fetched(self) -> bool:
+        """Was the local clone fetched less than max_staleness seconds ago."""
+        fetch_head = self.local / ".git" / "FETCH_HEAD"
+        return (
+            self.max_staleness > 0
+            and fetch_head.exists()
+            and time.time() - fetch_head.stat().st_mtime < self.max_staleness
+        )
+
+    def lock_path(self) -> Path:
+        """Path to the lock file for the local clone."""
+        return self.local.parent / f"{self.local.name}.lock"
+
+    @contextmanager
+    def _lock(self, exclusive: bool) -> Iterator:
+        """Advisory lock on the local clone shared by all processes using it.
 
-    def pull(self) -> None:
-        """Pull latest data."""
-        self._do_cmd(["git", "-C", self.local, "pull"])
-        self._do_cmd(
-            ["git", "-C", self.local, "reset", "--hard", f"origin/{GIT_JOB_LOG_BRANCH}"]
+        Readers share the lock, writers (fetch / commit) hold it exclusively.
+        Re-entrant within a thread, raises LockTimeout after lock_timeout seconds.
+        """
+        held = getattr(self._held, "mode", None)
+        if held == "exclusive" or (held == "shared" and not exclusive):
+            yield
+            return
+        if held == "shared":
+            raise Exception("Can't upgrade a shared lock to exclusive")
+        mode = "exclusive" if exclusive else "shared"
+        with self._flock(self.lock_path(), exclusive):
+            self._held.mode = mode
+            try:
+                yield
+            finally:
+                self._held.mode = None
+
+    def fetch_lock_path(self) -> Path:
+        """Path to the lock file serializing readers' object fetches."""
+        return self.local.parent / f"{self.local.name}.fetch.lock"
+
+    @contextmanager
+    def _flock(self, path: Path, exclusive: bool) -> Iterator:
+        """flock() path, raises LockTimeout after lock_timeout seconds."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        deadline = time.monotonic() + self.lock_timeout
+        with path.open("a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, flags)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        raise self._lock_timeout(exclusive, path) from None
+                    time.sleep(LOCK_POLL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock_timeout(self, exclusive: bool, path: Path) -> LockTimeout:
+        """Exception for a lock wait timing out."""
+        mode = "exclusive" if exclusive else "shared"
+        return LockTimeout(
+            f"Timed out after {self.lock_timeout}s waiting for {mode} lock "
+            f"{path}, another process is using {self.local}"
         )
 
     def local_path(self) -> Path:
@@ -111,130 +649,1125 @@ class GitJobLog:
         return Path(f"{GIT_JOB_LOG_DATA_DIR}/repos/{subpath}").expanduser().resolve()
 
     def set_git_identity(self) -> None:
-        """Set git identity for this process."""
+        """Set git config. (identity, safe.directory) for this process's commands.
+
+        Passed to each git command in its environment rather than written to
+        ~/.gitconfig, so constructing a GitJobLog doesn't run or lock anything.
+        """
+        self.git_config = {"safe.directory": str(self.local_path())}
         if Path("/.dockerenv").exists():
-            self._do_cmd("git config --global user.email user@docker.container")
-            self._do_cmd("git config --global user.name Docker")
+            self.git_config["user.email"] = "user@docker.container"
+            self.git_config["user.name"] = "Docker"
+
+    def _git_env(self) -> dict[str, str]:
+        """Environment for git commands, adding git_config as GIT_CONFIG_* vars."""
+        env = dict(os.environ)
+        count = int(env.get("GIT_CONFIG_COUNT") or 0)  # Keep the caller's.
+        for i, (key, value) in enumerate(self.git_config.items(), count):
+            env[f"GIT_CONFIG_KEY_{i}"] = key
+            env[f"GIT_CONFIG_VALUE_{i}"] = value
+        env["GIT_CONFIG_COUNT"] = str(count + len(self.git_config))
+        return env
 
+    @_operation
     def get_or_create_local(self) -> Path:
-        """Create local checkout of remote if needed."""
+        """Create local checkout of remote if needed.
+
+        No commands are run if it already exists.
+        """
         self.local = self.local_path()
         if not self.local.exists():
-            self.local.mkdir(parents=True, exist_ok=True)
-            self._do_cmd(["git", "clone", self.remote, self.local])
-            if not (self.local / ".git" / "config").exists():
-                raise Exception(f"Failed to clone {self.remote} to {self.local}")
-            self._do_cmd(
-                ["git", "-C", self.local, "checkout", "-b", GIT_JOB_LOG_BRANCH]
-            )
-            self._do_cmd(["git", "-C", self.local, "checkout", GIT_JOB_LOG_BRANCH])
-        self._do_cmd(
-            ["git", "config", "--global", "--add", "safe.directory", self.local]
-        )
+            with self._lock(exclusive=True):
+                if not self.local.exists():  # Not cloned while waiting for lock.
+                    self._clone()
         if not (self.local / ".git" / "config").exists():
             raise Exception(
                 f"Failed to sync. {self.remote} to {self.local}, delete latter perhaps?"
             )
         return self.local
 
+    def _clone(self) -> None:
+        """Clone the remote to self.local."""
+        self.local.mkdir(parents=True, exist_ok=True)
+        options = []
+        if self.clone_filter:
+            options.append(f"--filter={self.clone_filter}")
+        if self.shallow_since:
+            options.append(f"--shallow-since={self.shallow_since}")
+        if self.clone_depth:
+            options.append(f"--depth={self.clone_depth}")
+        if options:
+            options.extend(["--no-single-branch", "--no-tags"])
+        if self.clone_filter or self.sparse:
+            # Checking out would fetch blobs, log_run() etc. don't use the checkout.
+            options.append("--no-checkout")
+        self._do_cmd(["git", "clone", *options, self.remote, self.local])
+        if not (self.local / ".git" / "config").exists():
+            raise Exception(f"Failed to clone {self.remote} to {self.local}")
+        if self.sparse:
+            self._do_cmd(
+                ["git", "-C", self.local, "sparse-checkout", "set", *self.sparse]
+            )
+        if "--no-checkout" in options:
+            self._do_cmd(
+                [
+                    "git",
+                    "-C",
+                    self.local,
+                    "symbolic-ref",
+                    "HEAD",
+                    f"refs/heads/{GIT_JOB_LOG_BRANCH}",
+                ]
+            )
+        else:
+            self._do_cmd(
+                ["git", "-C", self.local, "checkout", "-b", GIT_JOB_LOG_BRANCH]
+            )
+            self._do_cmd(["git", "-C", self.local, "checkout", GIT_JOB_LOG_BRANCH])
+
+    @_operation
     def log_run(
         self, jobs: list[JobType], data: dict | str | None = None, edit: bool = False
-    ) -> None:
-        """Log running of listed jobs."""
-        self.pull()
-        updated = datetime.now()
-        if data is None:
-            data = ""
-        if not isinstance(data, (bytes, str)):
+    ) -> Future | None:
+        """Log running of listed jobs.
+
+        Inside a `batch()` context the run is queued for a shared commit and a
+        Future resolved once that commit's been pushed is returned.
+        """
+        jobs = _job_ids(jobs)
+        if self._batcher is not None and not edit:
+            return self._batcher.add(jobs, data)
+        self._commit_runs([(jobs, data)], edit=edit)
+        return None
+
+    @contextmanager
+    def batch(self, max_delay: float = 1.0, max_size: int = 100) -> Iterator:
+        """Group log_run() calls, from any thread, into shared commits and pushes.
+
+        Queued runs are committed when max_size are waiting, max_delay seconds
+        after the first was queued, or when the context exits.
+
+            with gjl.batch():
+                done = [gjl.log_run([job], data) for job, data in results]
+            for i in done:
+                i.result()  # Raises if this run's commit / push failed.
+        """
+        batcher = _Batcher(self, max_delay, max_size)
+        self._batcher = batcher
+        try:
+            yield batcher
+        finally:
+            self._batcher = None
+            batcher.close()
+
+    def _commit_runs(self, runs: list[tuple], edit: bool = False) -> None:
+        """Commit and push one or more (jobs, data) runs as a single commit.
+
+        If the push is rejected, typically because another writer pushed first,
+        the runs are re-applied on top of the fetched tip and pushed again with
+        jittered exponential backoff, up to max_push_retries times.
+        """
+        message = _run_message(runs)
+        if edit:
+            message = self._edit_message(message)
+        self._drive(self._push_steps(runs, message))
+
+    def _drive(self, steps: Generator):
+        """Do the I/O a *_steps() generator asks for, return its result."""
+        result = None
+        while True:
             try:
-                data = yaml.safe_dump(data)
-            except yaml.representer.RepresenterError:
-                data = str(data)
-        old_last_runs = self.last_runs()
-        for job_i in jobs:
-            job = job_i.strip("/")
-            (self.local / job).mkdir(parents=True, exist_ok=True)
-            job_file = self.local / job / GIT_JOB_LOG_RUN_FILE
-            use_data = data
-            if job_file.exists() and job_file.read_text() == data:
-                # Append this to make the file different, git supports empty commits but
-                # not associating unchanged files with them.
-                use_data += f"\n### UPDATED: {updated}"
-            job_file.write_text(use_data)
-        self._do_cmd(["git", "-C", self.local, "add", "-A"])
-        job_list = ", ".join(jobs)
-        comment = f", {data[:80]}" if isinstance(data, str) and data.strip() else ""
-        self._do_cmd(
-            ["git", "-C", self.local, "commit", "-m", f"ran: {job_list}{comment}"]
+                step = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = self._step(step)
+
+    def _step(self, step: tuple):
+        """Do one step's I/O, see _Cmd etc."""
+        if isinstance(step, _Cmd):
+            return self._run(step.argv, input=step.input)
+        if isinstance(step, _Stream):
+            with closing(self._stream_cmd(step.argv)) as lines:
+                for line in lines:
+                    if step.feed(line):
+                        break
+            return None
+        if isinstance(step, _ReadObjects):
+            return self.cat_file.read(step.objects)
+        if isinstance(step, _Gather):
+            return [self._drive(i) for i in step.steps]
+        if isinstance(step, _Sleep):
+            time.sleep(step.seconds)
+            return None
+        if isinstance(step, _Exclusive):
+            with self._lock(exclusive=True):
+                return self._drive(step.steps)
+        if isinstance(step, _FetchLocked):
+            with self._flock(self.fetch_lock_path(), exclusive=True):
+                return self._drive(step.steps)
+        raise TypeError(f"Unknown step {step!r}")
+
+    def _cmd_steps(
+        self, cmd: list[str | Path], input: str | bytes | None = None, check=False
+    ) -> Generator:
+        """Run a command, return its stdout, if check raise if it fails."""
+        proc = yield _Cmd(cmd, input)
+        if check:
+            _check_returncode(cmd, proc.returncode, proc.stderr)
+        return proc.stdout.decode("utf8")
+
+    def _push_steps(self, runs: list[tuple], message: str) -> Generator:
+        """Commit and push runs, retrying rejected pushes.
+
+        Each attempt holds the exclusive lock, it's released while backing off.
+        """
+        for attempt in range(self.max_push_retries + 1):
+            if attempt:
+                self.push_stats["retries"] += 1
+                yield _Sleep(_backoff(attempt))
+            if (yield _Exclusive(self._push_attempt_steps(runs, message))):
+                return
+        self.push_stats["failures"] += 1
+        raise Exception(
+            f"LOGGING JOB(S) FAILED: push rejected {attempt + 1} times:\n"
+            + "\n".join(job for jobs, _ in runs for job in jobs)
         )
-        if edit:
-            self._do_cmd(
-                ["git", "-C", self.local, "commit", "--amend"], capture_output=False
+
+    def _push_attempt_steps(self, runs: list[tuple], message: str) -> Generator:
+        """Fetch, commit runs on the tip and push, return False if rejected."""
+        yield from self._fetch_steps()
+        jobs = [job for jobs, _ in runs for job in jobs]
+        parent = yield from self._head_steps()
+        old_blobs = (yield from self._run_blobs_steps(parent, jobs)) if parent else {}
+        commit = yield from self._commit_steps(runs, message, parent, old_blobs)
+        commit = _check_object_id(commit)
+        self.push_stats["pushes"] += 1
+        cmd = [
+            "git",
+            "-C",
+            self.local,
+            "push",
+            "origin",
+            f"{commit}:refs/heads/{GIT_JOB_LOG_BRANCH}",
+        ]
+        pushed = yield _Cmd(cmd)
+        if pushed.returncode:
+            if not _push_rejected(pushed.stderr):  # Retrying won't help.
+                self.push_stats["failures"] += 1
+                _check_returncode(cmd, pushed.returncode, pushed.stderr)
+            self.push_stats["rejected"] += 1
+            return False
+        for ref in (
+            f"heads/{GIT_JOB_LOG_BRANCH}",
+            f"remotes/origin/{GIT_JOB_LOG_BRANCH}",
+        ):
+            yield from self._cmd_steps(
+                ["git", "-C", self.local, "update-ref", f"refs/{ref}", commit],
+                check=True,
             )
-        self._do_cmd(
-            [
-                "git",
-                "-C",
-                self.local,
-                "push",
-                "--set-upstream",
-                "origin",
-                GIT_JOB_LOG_BRANCH,
-            ]
+        blobs = yield from self._run_blobs_steps(commit, jobs)
+        _check_logged(jobs, old_blobs, blobs)
+        return True
+
+    def _commit_steps(
+        self, runs: list[tuple], message: str, parent: str | None, old_blobs: dict
+    ) -> Generator:
+        """Write a commit of runs on top of parent, return its id.
+
+        The commit is built from the parent commit's tree plus the new RUN blobs
+        with git plumbing, the working tree isn't written or scanned.  old_blobs
+        maps job -> its RUN blob id in parent.
+        """
+        updated = datetime.now()
+        runs = [(jobs, _encode(data)) for jobs, data in runs]
+        blobs = yield _Gather([self._hash_object_steps(data) for _, data in runs])
+        changes, marked = {}, {}
+        for (jobs, data), blob in zip(runs, blobs):
+            for job in jobs:
+                path = f"{job}/{GIT_JOB_LOG_RUN_FILE}"
+                changes[path] = blob
+                if old_blobs.get(job) == blob:
+                    marked[path] = _mark_updated(data, updated)
+        marked_blobs = yield _Gather(
+            [self._hash_object_steps(data) for data in marked.values()]
+        )
+        changes.update(zip(marked, marked_blobs))
+        tree = yield from self._tree_steps(
+            f"{parent}^{{tree}}" if parent else None, changes
+        )
+        commit = yield from self._cmd_steps(
+            ["git", "-C", self.local, "commit-tree", tree, "-F", "-"]
+            + (["-p", parent] if parent else []),
+            input=message,
+            check=True,
+        )
+        return commit.strip()
+
+    def _run_blobs_steps(self, rev: str, jobs: list[JobType]) -> Generator:
+        """Map job -> RUN blob id in commit rev, for just these jobs."""
+        listing = yield from self._cmd_steps(
+            ["git", "-C", self.local, "-c", "core.quotePath=off", "ls-tree"]
+            + ["-r", rev, "--"]
+            + [f"{job}/{GIT_JOB_LOG_RUN_FILE}" for job in jobs],
+            check=True,
         )
-        last_runs = self.last_runs()
-        # Check new commits are in repo. - this is the core function so need to
-        # fail if not
-        errors = []
-        for job in jobs:
-            if job not in last_runs:
-                errors.append(f"MISSING: {job}")
-            elif (
-                job in old_last_runs
-                and last_runs[job].timestamp == old_last_runs[job].timestamp
-            ):
-                errors.append(f"NO_UPDATE: {job}")
-        if errors:
-            raise Exception("LOGGING JOB(S) FAILED:\n" + "\n".join(errors))
-
-    def last_ran(self, job: JobType, batch=False) -> LastRun:
-        """LastRun info. for this job."""
+        return {
+            _path_job(path): blob for path, blob in _parse_tree_blobs(listing).items()
+        }
+
+    def _head(self) -> str | None:
+        """Commit id of HEAD, None before anything is logged."""
+        return self._drive(self._head_steps())
+
+    def _head_steps(self) -> Generator:
+        """Commit id of HEAD, None before anything is logged."""
+        head = yield from self._cmd_steps(
+            ["git", "-C", self.local, "rev-parse", "--verify", "-q", "HEAD"]
+        )
+        return head.strip() or None
+
+    def _hash_object_steps(self, data: str | bytes) -> Generator:
+        """Write data to the object store, return its blob id."""
+        blob = yield from self._cmd_steps(
+            ["git", "-C", self.local, "hash-object", "-w", "--stdin"],
+            input=data,
+            check=True,
+        )
+        return blob.strip()
+
+    def _tree_steps(self, tree: str | None, changes: dict) -> Generator:
+        """Write tree with changes (path -> blob id) applied, return its id.
+
+        Only the trees on the paths to changed blobs are read and rewritten.
+        """
+        listing = ""
+        if tree:
+            listing = yield from self._cmd_steps(
+                ["git", "-C", self.local, "ls-tree", "-z", tree], check=True
+            )
+        entries, subdirs = _apply_blobs(listing, changes)
+        sub_trees = yield _Gather(
+            [self._tree_steps(*subdir) for subdir in subdirs.values()]
+        )
+        for name, sub_tree in zip(subdirs, sub_trees):
+            entries[name] = f"040000 tree {sub_tree}"
+        listing = "".join(f"{info}\t{name}\0" for name, info in entries.items())
+        tree = yield from self._cmd_steps(
+            ["git", "-C", self.local, "mktree", "-z"], input=listing, check=True
+        )
+        return tree.strip()
+
+    def _edit_message(self, message: str) -> str:
+        """Let the user edit a commit message with their git editor."""
+        path = self.local / ".git" / "JOB_LOG_EDITMSG"
+        path.write_text(message + "\n")
+        editor = self._do_cmd(["git", "-C", self.local, "var", "GIT_EDITOR"]).strip()
+        self._do_cmd(["sh", "-c", f'{editor} "$@"', editor, path], capture_output=False)
+        lines = path.read_text().split("\n")
+        return "\n".join(i for i in lines if not i.startswith("#")).strip() or message
+
+    @property
+    def cat_file(self) -> "_CatFile":
+        """This GitJobLog's `git cat-file --batch` reader, started on first use."""
+        if self._cat_file is None:
+            self._cat_file = _CatFile(self)
+        return self._cat_file
+
+    def close(self) -> None:
+        """Stop helper processes, they're restarted if this GitJobLog is reused."""
+        if self._cat_file is not None:
+            self._cat_file.close()
+
+    @_operation
+    def data_at(self, job: JobType, rev: str = "HEAD") -> str | dict | None:
+        """A job's RUN data as of commit rev, None if it didn't exist then."""
+        data = self.cat_file.read([f"{rev}:{job}/{GIT_JOB_LOG_RUN_FILE}"])
+        data = next(iter(data.values()))
+        return None if data is None else _decode(data.decode("utf8"))
+
+    @_operation
+    def last_ran(self, job: JobType, batch=False, with_data: bool = True) -> LastRun:
+        """LastRun info. for this job, data None unless with_data."""
         if not batch:
             self.pull()
-        job_file = self.local / job / GIT_JOB_LOG_RUN_FILE
-        if not job_file.exists():
+        with self._lock(exclusive=False):
+            return self._drive(self._last_ran_steps(job, with_data))
+
+    def _last_ran_steps(self, job: JobType, with_data: bool) -> Generator:
+        """LastRun for job, see last_ran()."""
+        index = yield from self._index_steps()
+        if job not in index:
             return LastRun(timestamp=None, data=None)
-        last = self._do_cmd(
+        last = yield from self._last_runs_steps({job: index[job]}, with_data)
+        return last[job]
+
+    @_operation
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """List last run time for all jobs, or those under prefix / matching select.
+
+        prefix is a job ID prefix like "work/commute", select a list of words as
+        for util.job_match(), e.g. ["commute", "pass.*"].  Only selected RUN
+        files are read, and if the on-disk index isn't usable only the selected
+        part of the tree and history is.  Without with_data no RUN files are
+        read and LastRun.data is None.
+        """
+        self.pull()
+        with self._lock(exclusive=False):
+            return self._drive(self._select_steps(prefix, select, with_data))
+
+    def _select_steps(
+        self, prefix: str | None, select: list[str] | None, with_data: bool
+    ) -> Generator:
+        """LastRuns for jobs under prefix matching select, see last_runs()."""
+        index = yield from self._index_steps(_job_pathspec(prefix, select))
+        jobs = _select_jobs(index, prefix, select)
+        return (yield from self._last_runs_steps(jobs, with_data))
+
+    @_operation
+    def run_history(
+        self,
+        job: JobType,
+        since: datetime | str | None = None,
+        until: datetime | str | None = None,
+        limit: int | None = None,
+    ) -> Iterator[PastRun]:
+        """Runs of job, newest first, streamed from one `git log`.
+
+        since / until are datetimes or anything `git log --since` accepts, e.g.
+        "1 month ago".  Data is read lazily, so memory use doesn't grow with the
+        number of runs.  In a shallow clone only local history is listed.
+        """
+        self.pull()
+        if not self._head():  # Nothing logged yet.
+            return
+        cmd = ["git", "-C", self.local, "--no-pager", "log", "--no-renames"]
+        cmd.extend(["--diff-filter=AMT", "--format=%H %cI"])  # Not deletions.
+        for option, value in (("since", since), ("until", until)):
+            if value is not None:
+                if isinstance(value, datetime):
+                    # Commit times are whole seconds, git ignores fractions.
+                    seconds = value.timestamp()
+                    rounded = math.ceil if option == "since" else math.floor
+                    value = f"@{rounded(seconds)}"
+                cmd.append(f"--{option}={value}")
+        if limit is not None:
+            cmd.append(f"--max-count={limit}")
+        cmd.extend(["HEAD", "--", f"{job}/{GIT_JOB_LOG_RUN_FILE}"])
+        for line in self._stream_cmd(cmd):
+            if line:
+                commit, when = line.split(" ", 1)
+                yield PastRun(self, job, commit, datetime.fromisoformat(when))
+
+    def _last_runs_steps(self, index: dict, with_data: bool = True) -> Generator:
+        """LastRuns from index entries, reading all RUN blobs in one go."""
+        if not with_data:
+            return {job: LastRun(timestamp=when) for job, (when, _) in index.items()}
+        yield from self._prefetch_steps(index)
+        found = yield _ReadObjects(sorted({blob for _, blob in index.values()}))
+        text = {
+            blob: None if data is None else data.decode("utf8")
+            for blob, data in found.items()
+        }
+        return {
+            job: LastRun(
+                timestamp=when, data=None if text[blob] is None else _decode(text[blob])
+            )
+            for job, (when, blob) in index.items()
+        }
+
+    def _prefetch_steps(self, index: dict) -> Generator:
+        """Fetch the RUN blobs of index entries a partial clone lacks at once.
+
+        Reading them would otherwise fetch each with its own `git fetch`.
+        """
+        if self._partial is None:
+            promisor = yield from self._cmd_steps(
+                ["git", "-C", self.local, "config", "--get", "remote.origin.promisor"]
+            )
+            self._partial = promisor.strip() == "true"
+        if not self._partial or not index:
+            return
+        if (yield from self._missing_steps(index)):
+            yield _FetchLocked(self._fetch_missing_steps(index))
+
+    def _missing_steps(self, index: dict) -> Generator:
+        """RUN blobs of index entries missing from a partial clone."""
+        # Lists blobs of HEAD's tree, "?" marking missing ones, without fetching.
+        cmd = ["git", "-C", self.local, "rev-list", "--objects", "--missing=print"]
+        cmd.extend(["--no-walk", "HEAD"])
+        if len(index) <= PREFETCH_PATHS:
+            cmd.extend(
+                ["--", *(f":(literal){job}/{GIT_JOB_LOG_RUN_FILE}" for job in index)]
+            )
+        listing = yield from self._cmd_steps(cmd, check=True)
+        wanted = {blob for _, blob in index.values()}
+        missing = {i[1:].strip() for i in listing.split("\n") if i.startswith("?")}
+        return missing & wanted
+
+    def _fetch_missing_steps(self, index: dict) -> Generator:
+        """Fetch missing RUN blobs, unless another reader fetched them meanwhile."""
+        missing = yield from self._missing_steps(index)
+        if missing:
+            yield from self._cmd_steps(
+                [
+                    "git",
+                    "-C",
+                    self.local,
+                    "-c",
+                    "fetch.negotiationAlgorithm=noop",
+                    "fetch",
+                    "--no-tags",
+                    "--no-write-fetch-head",
+                    "--filter=blob:none",
+                    "--stdin",
+                    "origin",
+                ],
+                input="".join(f"{i}\n" for i in sorted(missing)),
+                check=True,
+            )
+
+    def _sparse_pathspec(self) -> list[str] | None:
+        """git pathspec for the RUN files of sparse jobs, None if not sparse."""
+        if not self.sparse:
+            return None
+        return [f":(literal){i}/" for i in self.sparse]
+
+    def index_path(self) -> Path:
+        """Path to the on-disk last run index, one per sparse set of prefixes."""
+        if not self.sparse:
+            return self.local / ".git" / GIT_JOB_LOG_INDEX_FILE
+        key = hashlib.sha256("\n".join(sorted(self.sparse)).encode("utf8"))
+        name = GIT_JOB_LOG_INDEX_FILE.replace(".json", f".{key.hexdigest()[:12]}.json")
+        return self.local / ".git" / name
+
+    @_operation
+    def run_index(self, pathspec: list[str] | None = None) -> dict:
+        """Map job -> (last run datetime, RUN blob id) as of HEAD.
+
+        The map is cached on disk with the HEAD it was built from.  If HEAD has
+        moved forward only the new commits are examined, a full rebuild is only
+        needed when the cache is missing / corrupt or HEAD moved non-fast-forward.
+
+        With a pathspec a rebuild covers just those RUN files and isn't cached,
+        the result may also contain other jobs.  With sparse set only jobs under
+        the sparse prefixes are indexed.
+        """
+        return self._drive(self._index_steps(pathspec))
+
+    def _index_steps(self, pathspec: list[str] | None = None) -> Generator:
+        """See run_index()."""
+        head = yield from self._head_steps()
+        if not head:  # Nothing logged yet.
+            return {}
+        cached_head, index = self._read_index()
+        if cached_head == head:
+            return index
+        sparse = self._sparse_pathspec()
+        if cached_head and (yield from self._is_ancestor_steps(cached_head, head)):
+            index = yield from self._update_index_steps(index, cached_head, head)
+        elif pathspec and not sparse:  # Partial, not cached.
+            return (yield from self._build_index_steps(head, pathspec))
+        else:
+            index = yield from self._build_index_steps(head, sparse)
+        self._write_index(head, index)
+        return index
+
+    def _read_index(self) -> tuple[str | None, dict]:
+        """Load the on-disk index, (None, {}) if missing or unreadable."""
+        try:
+            cached = json.loads(self.index_path().read_text())
+            index = {
+                job: (datetime.fromisoformat(when), blob)
+                for job, (when, blob) in cached["jobs"].items()
+            }
+            return cached["head"], index
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, {}
+
+    def _write_index(self, head: str, index: dict) -> None:
+        """Atomically replace the on-disk index."""
+        path = self.index_path()
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        jobs = {
+            job: (index[job][0].isoformat(), index[job][1]) for job in sorted(index)
+        }
+        tmp.write_text(json.dumps({"head": head, "jobs": jobs}))
+        tmp.replace(path)
+
+    def _is_ancestor_steps(self, old: str, new: str) -> Generator:
+        """Is commit old an ancestor of (or equal to) commit new."""
+        base = yield from self._cmd_steps(
+            ["git", "-C", self.local, "merge-base", old, new]
+        )
+        return base.strip() == old
+
+    def _tree_blobs_steps(
+        self, rev: str, pathspec: list[str] | None = None
+    ) -> Generator:
+        """Map RUN file path -> blob id for all jobs in rev, or those in pathspec."""
+        cmd = ["git", "-C", self.local, "-c", "core.quotePath=off"]
+        if pathspec is None or all(i.startswith(":(literal)") for i in pathspec):
+            listing = yield from self._cmd_steps(
+                [*cmd, "ls-tree", "-r", rev, "--", *(pathspec or [])], check=True
+            )
+            return _parse_tree_blobs(listing)
+        # ls-tree doesn't support :(glob), a diff from the empty tree does.
+        if self._empty_tree is None:
+            empty_tree = yield from self._cmd_steps(
+                ["git", "-C", self.local, "hash-object", "-t", "tree", "--stdin"],
+                input="",
+                check=True,
+            )
+            self._empty_tree = empty_tree.strip()
+        cmd.extend(["diff-tree", "-r", "--no-renames", self._empty_tree, rev, "--"])
+        listing = yield from self._cmd_steps([*cmd, *pathspec], check=True)
+        return _parse_tree_blobs(listing, blob_field=3)
+
+    def _build_index_steps(
+        self, head: str, pathspec: list[str] | None = None
+    ) -> Generator:
+        """Build the index from scratch with one history walk."""
+        blobs = yield from self._tree_blobs_steps(head, pathspec)
+        timestamps = yield from self._scan_history_steps(set(blobs), head, pathspec)
+        return _new_index(blobs, timestamps)
+
+    def _update_index_steps(self, index: dict, old: str, new: str) -> Generator:
+        """Apply the commits old..new to index, reading history and diff at once."""
+        sparse = self._sparse_pathspec()
+        timestamps, changes = yield _Gather(
+            [
+                self._scan_history_steps(None, f"{old}..{new}", sparse),
+                self._cmd_steps(
+                    [
+                        "git",
+                        "-C",
+                        self.local,
+                        "-c",
+                        "core.quotePath=off",
+                        "diff-tree",
+                        "-r",
+                        "--no-renames",
+                        old,
+                        new,
+                        "--",
+                        *(sparse or []),
+                    ]
+                ),
+            ]
+        )
+        updated = _apply_commits(index, timestamps, changes)
+        if updated is None:  # Unexpected, don't guess.
+            return (yield from self._build_index_steps(new, sparse))
+        return updated
+
+    def _scan_history_steps(
+        self,
+        paths: set[str] | None,
+        rev: str = "HEAD",
+        pathspec: list[str] | None = None,
+    ) -> Generator:
+        """Map each of paths to the time of the latest commit touching it.
+
+        Uses a single streamed `git log --name-only` rather than a `git log -1` per
+        path, and stops reading history once every path has been seen.  With paths
+        None every path touched in rev is reported.  A pathspec limits the log
+        to commits touching it.
+
+        In a shallow clone, paths last seen in the oldest local commit may have
+        been touched earlier, so history is deepened and scanned again.
+        """
+        cmd = [
+            "git",
+            "-C",
+            self.local,
+            "-c",
+            "core.quotePath=off",
+            "--no-pager",
+            "log",
+            "--no-renames",
+            "--name-only",
+            HISTORY_FORMAT,
+            rev,
+        ]
+        if pathspec:
+            cmd.extend(["--", *pathspec])
+        while True:
+            scan = _HistoryScan(paths)
+            if scan.done:
+                return scan.timestamps
+            yield _Stream(cmd, scan.feed)
+            shallow = self._shallow_commits()
+            if not scan.uncertain(shallow):
+                return scan.timestamps
+            yield _FetchLocked(self._deepen_steps(rev, shallow))
+
+    def _shallow_commits(self) -> set[str]:
+        """Oldest commits of a shallow clone, empty if not shallow."""
+        try:
+            return set((self.local / ".git" / "shallow").read_text().split())
+        except FileNotFoundError:
+            return set()
+
+    def _deepen_steps(self, rev: str, shallow: set[str]) -> Generator:
+        """Double the history in a shallow clone, unless another reader just did.
+
+        No refs or FETCH_HEAD are written, readers run this under the shared lock.
+        """
+        if self._shallow_commits() != shallow:
+            return
+        depth = yield from self._cmd_steps(
+            ["git", "-C", self.local, "rev-list", "--count", rev.split("..")[-1]]
+        )
+        yield from self._cmd_steps(
             [
                 "git",
                 "-C",
                 self.local,
-                "--no-pager",
-                "log",
-                "-1",
-                "--format=%cI",
-                job_file,
-            ]
-        ).strip()
+                "fetch",
+                "--no-tags",
+                "--no-write-fetch-head",
+                f"--deepen={max(int(depth or 0), 1)}",
+                "origin",
+                GIT_JOB_LOG_BRANCH,
+            ],
+            check=True,
+        )
+        if self._shallow_commits() == shallow:
+            raise Exception(
+                f"Failed to deepen shallow clone {self.local} to find last runs"
+            )
 
-        data = job_file.read_text()
-        try:
-            if data.strip():  # Don't change ""
-                data = yaml.safe_load(data)
-        except yaml.scanner.ScannerError:
-            pass
 
-        return LastRun(timestamp=datetime.fromisoformat(last), data=data)
+class _Batcher:
+    """Queue of runs committed together by a background thread."""
+
+    def __init__(self, gjl: GitJobLog, max_delay: float, max_size: int):
+        """Start the flushing thread."""
+        self.gjl = gjl
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self.pending = []  # [(jobs, data, Future), ...]
+        self.first_queued = 0.0
+        self.closed = False
+        self.ready = threading.Condition()
+        self.thread = threading.Thread(target=self._flusher, daemon=True)
+        self.thread.start()
+
+    def add(self, jobs: list[JobType], data: dict | str | None) -> Future:
+        """Queue a run."""
+        future = Future()
+        with self.ready:
+            if self.closed:
+                raise Exception("Batch is closed, can't queue more runs")
+            if not self.pending:
+                self.first_queued = time.monotonic()
+            self.pending.append((jobs, data, future))
+            self.ready.notify()
+        return future
+
+    def close(self) -> None:
+        """Commit anything still queued and stop the flushing thread."""
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        self.thread.join()
+
+    def _next_batch(self) -> list:
+        """Wait for a full / due batch, [] when closed and empty."""
+        with self.ready:
+            while True:
+                if not self.pending and self.closed:
+                    return []
+                wait = None
+                if self.pending:
+                    wait = self.first_queued + self.max_delay - time.monotonic()
+                    if self.closed or len(self.pending) >= self.max_size or wait <= 0:
+                        break
+                self.ready.wait(wait)
+            batch = self.pending[: self.max_size]
+            self.pending = self.pending[self.max_size :]
+            self.first_queued = time.monotonic()
+            return batch
+
+    def _flusher(self) -> None:
+        """Commit batches until closed."""
+        while batch := self._next_batch():
+            try:
+                with _operation_scope("log_run"):
+                    self.gjl._commit_runs([(jobs, data) for jobs, data, _ in batch])
+            except Exception as exc:  # noqa:BLE001 - reported to each caller
+                for *_, future in batch:
+                    future.set_exception(exc)
+            else:
+                for *_, future in batch:
+                    future.set_result(None)
+
+
+class _CatFile:
+    """Long-lived `git cat-file --batch` process serving object reads over a pipe."""
+
+    # Requests written before reading responses, small enough that the request
+    # text always fits in the pipe buffer so neither side can block the other.
+    CHUNK = 512
+
+    def __init__(self, gjl: GitJobLog):
+        """Process is started on first read."""
+        self.gjl = gjl
+        self.proc = None
+        self.mutex = threading.Lock()
 
-    def last_runs(self) -> dict:
-        """List last run time for all jobs.
+    def read(self, objects: list[str]) -> dict:
+        """Map object name (blob id, rev:path, ...) -> bytes, None if missing.
 
-        git ls-tree -r --name-only HEAD | \
-            xargs -IF git --no-pager log -1 --format='%cI F' F
+        Restarts the process once if it has died.
         """
-        self.pull()
-        file_list = self._do_cmd(
-            ["git", "-C", self.local, "ls-tree", "-r", "--name-only", "HEAD"]
-        ).split("\n")
-        file_list = [i.rsplit("/", 1)[0] for i in file_list if i.strip()]
-        return {job: self.last_ran(job, batch=True) for job in file_list}
+        with self.mutex:
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+            start = time.perf_counter()
+            try:
+                found = self._read(objects)
+            except (BrokenPipeError, EOFError):  # Died since the poll(), retry once.
+                self._stop()
+                self._start()
+                found = self._read(objects)
+            size = sum(len(i) for i in found.values() if i is not None)
+            self.gjl._emit(self.proc.args, start, None, size, 0)
+            return found
+
+    def close(self) -> None:
+        """Stop the process."""
+        with self.mutex:
+            self._stop()
+
+    def _start(self) -> None:
+        """Start the cat-file process."""
+        cmd = ["git", "-C", str(self.gjl.local), "cat-file", "--batch"]
+        if not self.gjl.silent:
+            print(cmd)
+        self.proc = subprocess.Popen(  # noqa:S603
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL if self.gjl.silent else None,
+            env=self.gjl._git_env(),
+        )
+
+    def _stop(self) -> None:
+        """Stop the process if it's running."""
+        if self.proc is None:
+            return
+        for pipe in self.proc.stdin, self.proc.stdout:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+        self.proc.wait()
+        self.proc = None
+
+    def _read(self, objects: list[str]) -> dict:
+        """Request objects a chunk at a time, parse responses."""
+        found = {}
+        for start in range(0, len(objects), self.CHUNK):
+            chunk = objects[start : start + self.CHUNK]
+            self.proc.stdin.write("".join(f"{i}\n" for i in chunk).encode("utf8"))
+            self.proc.stdin.flush()
+            for name in chunk:
+                header = self.proc.stdout.readline()
+                if not header:
+                    raise EOFError("git cat-file exited")
+                size = _object_size(header)
+                if size is None:
+                    found[name] = None
+                    continue
+                found[name] = self.proc.stdout.read(size)
+                self.proc.stdout.read(1)  # Trailing newline.
+        return found
+
+
+def _object_size(header: bytes) -> int | None:
+    """Size from a `git cat-file --batch` header, None if missing / ambiguous."""
+    info = header.split()
+    if len(info) != 3 or not info[2].isdigit():
+        return None
+    return int(info[2])
+
+
+def _parse_cat_file(objects: list[str], out: bytes) -> dict:
+    """Map object name -> bytes, None if missing, from `cat-file --batch` output."""
+    found, pos = {}, 0
+    for name in objects:
+        header_end = out.index(b"\n", pos)
+        size = _object_size(out[pos:header_end])
+        pos = header_end + 1
+        if size is None:
+            found[name] = None
+            continue
+        found[name] = out[pos : pos + size]
+        pos += size + 1  # Trailing newline.
+    return found
+
+
+class _HistoryScan:
+    """Latest commit time per path from `git log --name-only HISTORY_FORMAT`."""
+
+    def __init__(self, paths: set[str] | None):
+        """Look for paths, or all paths if None."""
+        self.todo = None if paths is None else set(paths)
+        self.timestamps = {}
+        self.commits = {}  # path -> commit id
+        self.commit = None
+        self.when = None
+
+    @property
+    def done(self) -> bool:
+        """Have all paths been seen."""
+        return self.todo is not None and not self.todo
+
+    def feed(self, line: str) -> bool:
+        """Process a line of log output, True when all paths have been seen."""
+        if line.startswith("\0"):
+            self.commit, when = line[1:].split(" ", 1)
+            self.when = datetime.fromisoformat(when)
+        elif self.todo is None:
+            if line and line not in self.timestamps:
+                self.timestamps[line] = self.when
+                self.commits[line] = self.commit
+        elif line in self.todo:
+            self.timestamps[line] = self.when
+            self.commits[line] = self.commit
+            self.todo.discard(line)
+        return self.done
+
+    def uncertain(self, shallow: set[str]) -> bool:
+        """Could any path have been touched before the shallow commits."""
+        if not shallow:
+            return False
+        if self.todo:  # Not seen at all in the local history.
+            return True
+        return not shallow.isdisjoint(self.commits.values())
+
+
+def _backoff(attempt: int) -> float:
+    """Seconds to wait before push retry attempt (1, 2, ...)."""
+    backoff = min(PUSH_BACKOFF_MAX, PUSH_BACKOFF * 2 ** (attempt - 1))
+    return backoff * random.uniform(0.5, 1.5)  # noqa:S311
+
+
+def _job_ids(jobs: list[JobType]) -> list[JobType]:
+    """Job IDs to log, raise if there are none rather than push an empty commit."""
+    jobs = [job.strip("/") for job in jobs]
+    if not jobs:
+        raise Exception("LOGGING JOB(S) FAILED: no jobs given")
+    return jobs
+
+
+def _run_message(runs: list[tuple]) -> str:
+    """Commit message for (jobs, data) runs."""
+    all_jobs = [job for jobs, _ in runs for job in jobs]
+    messages = []
+    for jobs, data in runs:
+        data = _encode(data)
+        comment = f", {data[:80]}" if isinstance(data, str) and data.strip() else ""
+        messages.append(f"ran: {', '.join(jobs)}{comment}")
+    if len(messages) > 1:
+        messages.insert(0, f"ran: {', '.join(all_jobs)}\n")
+    return "\n".join(messages)
+
+
+def _check_returncode(cmd: list, returncode: int, stderr: bytes | None) -> None:
+    """Raise if a command failed, with its stderr."""
+    if returncode:
+        stderr = (stderr or b"").decode("utf8", "replace").strip()
+        raise Exception(f"{' '.join(map(str, cmd))} failed ({returncode}): {stderr}")
+
+
+def _push_rejected(stderr: bytes | None) -> bool:
+    """Did a push fail because another writer pushed first."""
+    stderr = (stderr or b"").decode("utf8", "replace")
+    return any(reason in stderr for reason in PUSH_REJECTED)
+
+
+def _check_object_id(object_id: str) -> str:
+    """object_id, if it is one, never build a refspec from unchecked output.
+
+    An empty source in a push refspec deletes the destination branch.
+    """
+    if not OBJECT_ID.fullmatch(object_id):
+        raise Exception(f"LOGGING JOB(S) FAILED: bad commit id {object_id!r}")
+    return object_id
+
+
+def _mark_updated(data: str | bytes, updated: datetime) -> str | bytes:
+    """Data made different from a RUN file already containing it.
+
+    git supports empty commits but not associating unchanged files with them.
+    """
+    suffix = f"\n### UPDATED: {updated}"
+    return data + (suffix.encode("utf8") if isinstance(data, bytes) else suffix)
+
+
+def _check_logged(jobs: list[JobType], old_blobs: dict, blobs: dict) -> None:
+    """Check new commits are in repo. - this is the core function so need to fail.
+
+    old_blobs / blobs map job -> RUN blob id before / after the commit.
+    """
+    errors = []
+    for job in jobs:
+        if job not in blobs:
+            errors.append(f"MISSING: {job}")
+        elif blobs[job] == old_blobs.get(job):
+            errors.append(f"NO_UPDATE: {job}")
+    if errors:
+        raise Exception("LOGGING JOB(S) FAILED:\n" + "\n".join(errors))
+
+
+def _apply_blobs(listing: str, changes: dict) -> tuple[dict, dict]:
+    """Apply changes (path -> blob id) to `ls-tree -z` listing of a tree.
+
+    Returns ({name: "mode type id"}, {subdir: (its tree id | None, its changes)})
+    with blobs in this tree replaced, subdirs still need building.
+    """
+    entries = {}
+    for entry in listing.split("\0"):
+        if entry:
+            info, name = entry.split("\t", 1)
+            entries[name] = info
+    sub_changes = defaultdict(dict)
+    for path, blob in changes.items():
+        name, _, rest = path.partition("/")
+        if rest:
+            sub_changes[name][rest] = blob
+        else:
+            entries[name] = f"100644 blob {blob}"
+    subdirs = {}
+    for name, changed in sub_changes.items():
+        info = entries.get(name, "").split()
+        subdirs[name] = (info[2] if info and info[1] == "tree" else None, changed)
+    return entries, subdirs
+
+
+def _parse_tree_blobs(listing: str, blob_field: int = 2) -> dict:
+    """Map RUN file path -> blob id from `ls-tree -r` output.
+
+    blob_field is 3 for `diff-tree -r` output.
+    """
+    blobs = {}
+    for line in listing.split("\n"):
+        if not line.strip():
+            continue
+        info, path = line.split("\t", 1)
+        if path.endswith(f"/{GIT_JOB_LOG_RUN_FILE}"):
+            blobs[path] = info.split()[blob_field]
+    return blobs
+
+
+def _job_pathspec(
+    prefix: str | None, select: list[str] | None = None
+) -> list[str] | None:
+    """git pathspec covering the RUN files of jobs under prefix matching select.
+
+    None for all jobs.  select words are regexes matched at any depth
+    (util.job_match()), only all literal words can be turned into a glob, and
+    only without a prefix they could overlap.  Use _select_jobs() for the exact
+    selection.
+    """
+    if prefix and prefix.strip("/"):
+        return [f":(literal){prefix.strip('/')}/"]
+    if select and not any(REGEX_CHARS.intersection(word) for word in select):
+        # re.match() of a literal is a prefix test, hence word*.
+        words = "/".join(f"{word}*" for word in select)
+        return [f":(glob)**/{words}/**/{GIT_JOB_LOG_RUN_FILE}"]
+    return None
+
+
+def _select_jobs(
+    jobs: dict, prefix: str | None = None, select: list[str] | None = None
+) -> dict:
+    """Entries of {job: ...} for jobs under prefix and matching select."""
+    prefix = (prefix or "").strip("/")
+    if not prefix and not select:
+        return jobs
+    return {
+        job: value
+        for job, value in jobs.items()
+        if (not prefix or job == prefix or job.startswith(f"{prefix}/"))
+        and (not select or job_match(job, select))
+    }
+
+
+def _new_index(blobs: dict, timestamps: dict) -> dict:
+    """Index from RUN path -> blob id and RUN path -> last commit time."""
+    return {
+        _path_job(path): (timestamps[path], blob)
+        for path, blob in blobs.items()
+        if path in timestamps
+    }
+
+
+def _apply_commits(index: dict, timestamps: dict, changes: str) -> dict | None:
+    """New index from old, new commit times and `diff-tree -r` old new output.
+
+    None if the changes don't add up and the index should be rebuilt.
+    """
+    index = dict(index)
+    blobs, deleted = {}, set()
+    for line in changes.split("\n"):
+        if not line.strip():
+            continue
+        info, path = line.split("\t", 1)
+        if info.split()[4] == "D":
+            deleted.add(path)
+        else:
+            blobs[path] = info.split()[3]
+    for path in set(timestamps) | set(blobs) | deleted:
+        if not path.endswith(f"/{GIT_JOB_LOG_RUN_FILE}"):
+            continue
+        job = _path_job(path)
+        if path in deleted:
+            index.pop(job, None)
+            continue
+        old_when, old_blob = index.get(job, (None, None))
+        when, blob = timestamps.get(path, old_when), blobs.get(path, old_blob)
+        if when is None or blob is None:
+            return None
+        index[job] = (when, blob)
+    return index
+
+
+def _encode(data: dict | str | bytes | None) -> str | bytes:
+    """RUN file content for data, YAML for things that aren't str / bytes."""
+    if data is None:
+        data = ""
+    if not isinstance(data, (bytes, str)):
+        import yaml  # noqa:PLC0415 - slow to import, not needed for str data
+
+        try:
+            data = yaml.safe_dump(data)
+        except yaml.representer.RepresenterError:
+            data = str(data)
+    return data
+
+
+def _path_job(path: str) -> JobType:
+    """Job ID from RUN file path."""
+    return path.rsplit("/", 1)[0]
+
+
+def _decode(data: str) -> str | dict:
+    """YAML decode RUN file text if possible, with libyaml if available."""
+    if not data.strip():  # Don't change ""
+        return data
+    import yaml  # noqa:PLC0415 - slow to import, not needed for blank data
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    try:
+        data = yaml.load(data, Loader=loader)  # A safe loader, C or Python.
+    except yaml.scanner.ScannerError:
+        pass
+    return data
@@ -1,15 +1,24 @@
 """Plot job dependencies and status."""
+import hashlib
+import json
+import os
+import shutil
 import time
-from collections import defaultdict
-
-import pygraphviz as pgv
+from collections import Counter, defaultdict
+from pathlib import Path
 
 from git_job_log import LastRun
-from git_job_log.util import job_match
+from git_job_log.job_graph import JobGraph
+from git_job_log.util import JobMatcher, split_job
 
 FILL_GOOD = "#88aaff"
 FILL_BAD = "orange"
 
+# Attributes that don't change dot's layout, a make_plot() cache can reuse
+# positions when only these differ.
+STYLE_ATTRS = frozenset(("color", "fillcolor", "style", "tooltip", "run_at"))
+PLOT_CACHE_SIZE = 100  # files kept in a make_plot() cache_dir, most recently used
+
 
 # list of distinct colors from https://sashamaps.net/docs/resources/20-colors/
 # the distinctness and appeal decreases as you go down the list, so zip()ing with
@@ -39,8 +48,8 @@ COLORS = [
 
 
 def make_graph(depends):
-    """Make graph graph from edge list."""
-    graph = pgv.AGraph(directed=True)
+    """Make JobGraph from edge list, see make_plot() for rendering."""
+    graph = JobGraph()
     for edge_i, edge in enumerate(depends):
         # Tried making the edge colors more stable by hashing the edge, but
         # this is better for not re-using the same colors in the same area of
@@ -56,7 +65,7 @@ def make_graph(depends):
 
 
 def add_key(graph):
-    """Add a key, use after tests are run."""
+    """Add a key to a pygraphviz.AGraph, use after tests are run."""
     key = graph.add_subgraph(None, "cluster_key")
     key.graph_attr["label"] = "Key"
     # key.graph_attr["ranksep"] = 0.5
@@ -93,21 +102,29 @@ def label(node_id: str, max_len: int = 16) -> str:
 def annotate_graph(graph, description: dict | None = None) -> None:
     """Add labels and tooltips to graph.
 
-    Uses job_match() to apply applicable descriptions.
+    Uses a JobMatcher (job_match() rules) to apply applicable descriptions.
     """
     if description is None:
         description = {}
+    matcher = JobMatcher(description)
     for node_id in graph:
         graph._label[node_id] = [node_id]  # List of lines for tooltip.
-        graph._description[node_id] = [
-            description[k] for k in description if job_match(node_id, k)
-        ]
+        graph._description[node_id] = [description[k] for k in matcher.match(node_id)]
 
 
-def make_plot(graph, out_path, with_key=True) -> None:
+def make_plot(
+    graph, out_path, with_key=True, cache_dir=None, cache_size=PLOT_CACHE_SIZE
+) -> None:
     """Make a plot of graph.
 
-    Format depends on out_path extension.
+    Format depends on out_path extension.  Needs pygraphviz, graph is converted
+    with JobGraph.to_agraph().
+
+    With cache_dir, renders are stored there by a hash of the graph's edges,
+    attributes, label and format, and an identical graph is copied from there
+    without running dot.  If only STYLE_ATTRS or the (time stamp) label changed,
+    the cached layout is redrawn with them by `nop2` (`neato -n2`).  Only the
+    cache_size most recently used files are kept.
     """
     for node_id in graph:
         node = graph.get_node(node_id)
@@ -117,38 +134,122 @@ def make_plot(graph, out_path, with_key=True) -> None:
         node.attr["label"] = label(labels[0])
         if len(labels) > 1:
             node.attr["label"] += f"\\n+{len(labels) - 1}"
+        if node.attr.get("summary"):
+            node.attr["label"] += "\\n" + node.attr["summary"]
         description = ["\\n".join(sorted(labels))]
         notes = "\\n".join(sorted(set(graph._description[node_id])))
         if notes:
             description.append(notes)
         description.append("Last run: " + (node.attr.get("run_at") or "NEVER"))
         node.attr["tooltip"] = "\\n".join(description)
+    agraph = graph.to_agraph()
     if with_key:
-        add_key(graph)
-    graph.draw(out_path, prog="dot")
+        add_key(agraph)
+    if cache_dir is None:
+        agraph.draw(out_path, prog="dot")
+        return
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    suffix = Path(out_path).suffix
+    digest = plot_digest(graph, with_key, suffix, with_label=True)
+    render = cache_dir / (digest + suffix)
+    if _cache_get(render, lambda path: shutil.copyfile(path, out_path)):
+        return
+    layout = cache_dir / (plot_digest(graph, with_key, skip=STYLE_ATTRS) + ".dot")
+    laid_out = _cache_get(layout, lambda path: type(agraph)(filename=path))
+    if laid_out is not None:
+        restyle(laid_out, agraph)
+        laid_out.draw(out_path, prog="nop2")  # neato -n2, keep positions.
+    else:
+        agraph.layout(prog="dot")
+        _cache_put(layout, agraph.write)
+        agraph.draw(out_path)  # Uses layout above.
+    _cache_put(render, lambda path: shutil.copyfile(out_path, path))
+    _cache_prune(cache_dir, cache_size)
+
+
+def plot_digest(
+    graph, with_key: bool, suffix: str = "", skip=frozenset(), with_label=False
+) -> str:
+    """Hash of what make_plot() would draw, excluding skip and the graph label."""
+
+    def keep(attr):
+        return {k: str(v) for k, v in attr.items() if k not in skip}
+
+    graph_attr = {
+        k: v for k, v in graph.graph_attr.items() if with_label or k != "label"
+    }
+    content = {
+        "graph": keep(graph_attr),
+        "node": keep(graph.node_attr),
+        "edge": keep(graph.edge_attr),
+        "nodes": [[node, keep(node.attr)] for node in graph.iternodes()],
+        "edges": [[*edge, keep(edge.attr)] for edge in graph.iteredges()],
+        "key": with_key,
+        "suffix": suffix,
+    }
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def restyle(laid_out, agraph) -> None:
+    """Copy label and STYLE_ATTRS from agraph to laid_out, same graph + layout."""
+    laid_out.graph_attr["label"] = agraph.graph_attr["label"]
+    for node in agraph.iternodes():
+        style = {k: v for k, v in node.attr.items() if k in STYLE_ATTRS}
+        laid_out.get_node(node).attr.update(style)
+    for edge in agraph.iteredges():
+        style = {k: v for k, v in edge.attr.items() if k in STYLE_ATTRS}
+        laid_out.get_edge(*edge).attr.update(style)
+
+
+def _cache_get(path: Path, read):
+    """read(path) for path in a plot cache, marked as used, None if not cached."""
+    try:
+        os.utime(path)
+        return read(str(path))
+    except FileNotFoundError:  # Not cached, or pruned by another process.
+        return None
+
+
+def _cache_put(path: Path, write) -> None:
+    """Atomically create path in a plot cache by calling write(tmp_path)."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(str(tmp))
+    tmp.replace(path)
+
+
+def _cache_prune(cache_dir: Path, size: int) -> None:
+    """Delete all but the size most recently used files in a plot cache."""
+    entries = []
+    for path in cache_dir.iterdir():
+        if path.suffix != ".tmp":  # Being written.
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+    for _, path in sorted(entries, reverse=True)[size:]:
+        path.unlink(missing_ok=True)
 
 
 def squash_graph(graph):
-    """Collapse nodes that are only alternate paths between two other nodes."""
-    for node in graph.iternodes():
-        child_destinations = {
-            k: set(graph.successors(k)) for k in graph.successors(node)
-        }
-        # Children with only one destination.
-        child_destinations = {
-            k: v for k, v in child_destinations.items() if len(v) == 1
-        }
-        out_paths = defaultdict(set)
-        for child, destinations in child_destinations.items():
-            out_paths[next(iter(destinations))].add(child)
-        # Destinations reached by multiple single-destination children.
-        out_paths = {k: v for k, v in out_paths.items() if len(v) > 1}
-        for parallel_paths in out_paths.values():
-            paths = list(parallel_paths)
-            keep = paths.pop(0)
-            for child in paths:
-                merge_nodes(graph, keep, child)
-                graph.remove_node(child)
+    """Collapse nodes that are only alternate paths between two other nodes.
+
+    Children of a node that all have the same single child are merged into the
+    first of them in graph order.  The groups are found from the unsquashed
+    graph in one O(V+E) pass before any nodes are removed, so the result
+    doesn't depend on merge order.
+    """
+    parallel = defaultdict(list)  # (parent, destination) -> children
+    for node_id in graph:
+        for child in graph.successors(node_id):
+            if graph.out_degree(child) == 1:
+                parallel[node_id, graph.successors(child)[0]].append(child)
+    for children in parallel.values():
+        alive = [k for k in children if k in graph]  # Not merged elsewhere.
+        for child in alive[1:]:
+            merge_nodes(graph, alive[0], child)
+            graph.remove_node(child)
 
 
 def merge_nodes(graph, keep_id, child_id):
@@ -157,50 +258,146 @@ def merge_nodes(graph, keep_id, child_id):
     graph._description[keep_id].extend(graph._description[child_id])
 
 
-def recurse_status(graph, status, head, job_ran, ok):
-    """Recursively set status of jobs."""
-    if not ok:
-        status[head] = ok
-        graph.get_node(head).attr["fillcolor"] = FILL_BAD
-    for child in graph.out_neighbors(head):
-        child_ok = (
-            ok
-            and job_ran[head].timestamp is not None
-            and job_ran[child].timestamp is not None
-            and job_ran[child].timestamp >= job_ran[head].timestamp
-        )
-        recurse_status(graph, status, child, job_ran, child_ok)
+def neighborhood(graph, jobs, upstream: int | None = 1, downstream: int | None = 1):
+    """New graph of jobs and their upstream / downstream neighbors.
+
+    upstream and downstream are the number of hops to follow, None for no limit.
+    Plot this instead of the whole graph to lay out only what's shown.
+    """
+    keep = set(jobs)
+    for hops, step in (
+        (upstream, graph.predecessors),
+        (downstream, graph.successors),
+    ):
+        frontier, seen, hop = set(jobs), set(jobs), 0  # Own seen per direction.
+        while frontier and (hops is None or hop < hops):
+            frontier = {k for node_id in frontier for k in step(node_id)} - seen
+            seen |= frontier
+            hop += 1
+        keep |= seen
+    return _quotient(graph, {node_id: node_id for node_id in graph if node_id in keep})
+
+
+def cluster_graph(graph, depth: int = 2, expand=()):
+    """New graph with jobs collapsed into one node per job ID prefix.
+
+    Jobs with more than depth words are collapsed into a `prefix/*` node for their
+    first depth words, or more words for prefixes in expand, e.g. with depth=2
+    and expand=["home/yard"] "home/yard/lawn/mow" is in "home/yard/lawn/*".
+    Prefixes with only one job aren't collapsed.  If add_status() was used, the
+    cluster nodes summarize current / stale counts and are stale if any job is.
+    """
+    expand = set(expand)
+    members = defaultdict(list)
+    for node_id in graph:
+        words = split_job(node_id)
+        size = depth
+        while size < len(words) and "/".join(words[:size]) in expand:
+            size += 1
+        if len(words) > size:
+            members["/".join(words[:size]) + "/*"].append(node_id)
+        else:
+            members[node_id].append(node_id)
+    node_map = {}
+    for cluster_id, jobs in members.items():
+        for node_id in jobs:
+            node_map[node_id] = cluster_id if len(jobs) > 1 else node_id
+    clustered = _quotient(graph, node_map)
+
+    for cluster_id, jobs in members.items():
+        if len(jobs) == 1:
+            continue
+        nodes = [graph.get_node(node_id) for node_id in jobs]
+        node = clustered.get_node(cluster_id)
+        node.attr["shape"] = "box3d"
+        clustered._label[cluster_id] = [cluster_id]
+        clustered._description[cluster_id] = sorted(jobs)
+        fills = Counter(k.attr.get("fillcolor") for k in nodes)
+        if fills[FILL_GOOD] or fills[FILL_BAD]:
+            node.attr["summary"] = (
+                f"{fills[FILL_GOOD]} current, {fills[FILL_BAD]} stale"
+            )
+            node.attr["style"] = "filled"
+            node.attr["fillcolor"] = FILL_BAD if fills[FILL_BAD] else FILL_GOOD
+            run_at = [k.attr["run_at"] for k in nodes if k.attr["run_at"] != "NEVER"]
+            node.attr["run_at"] = max(run_at, default="NEVER")
+    return clustered
+
+
+def _quotient(graph, node_map: dict):
+    """New graph of nodes in node_map, renamed by it, with edges between them.
+
+    Attributes and labels are copied for nodes that keep their ID.
+    """
+    new = JobGraph()
+    for attrs in ("graph_attr", "node_attr", "edge_attr"):
+        getattr(new, attrs).update(getattr(graph, attrs))
+    new._label = defaultdict(list)
+    new._description = defaultdict(list)
+    for node in graph.iternodes():
+        if node in node_map:
+            new_id = node_map[node]
+            new.add_node(new_id)
+            if new_id == node:
+                new.get_node(new_id).attr.update(node.attr)
+                new._label[new_id] = list(graph._label[node])
+                new._description[new_id] = list(graph._description[node])
+    seen = set()
+    for edge in graph.iteredges():
+        parent, child = (node_map.get(node_id) for node_id in edge)
+        if parent and child and parent != child and (parent, child) not in seen:
+            seen.add((parent, child))
+            new.add_edge(parent, child, **edge.attr)
+    return new
+
+
+def stale_jobs(graph, job_ran: dict) -> set:
+    """Jobs that are out of date, found in one topological pass, O(V+E).
+
+    A job is stale if it never ran, ran before one of its parents, or one of its
+    parents is stale.  Raises an Exception if the graph has a cycle.
+    """
+    children = {node_id: graph.successors(node_id) for node_id in graph}
+    in_degree = Counter(child for kids in children.values() for child in kids)
+    ready = [node_id for node_id in children if not in_degree[node_id]]
+    stale = {node_id for node_id in children if job_ran[node_id].timestamp is None}
+    done = 0
+    while ready:
+        node_id = ready.pop()
+        done += 1
+        for child in children[node_id]:
+            if node_id in stale or (
+                child not in stale
+                and job_ran[child].timestamp < job_ran[node_id].timestamp
+            ):
+                stale.add(child)
+            in_degree[child] -= 1
+            if not in_degree[child]:
+                ready.append(child)
+    if done < len(children):
+        cycle = sorted(node_id for node_id in children if in_degree[node_id])
+        raise Exception(f"Cycle in job dependencies involving: {', '.join(cycle)}")
+    return stale
 
 
 def add_status(graph, gjl):
-    """Add up to dateness.
+    """Add up to dateness, from any JobLogBackend gjl.
 
     This also returns a job ID -> status mapping that is not really a
     visualization concern like everything else in this module, but this is the
     module that understands graphs and inherited out-of-dateness.
     """
-    job_ran = gjl.last_runs()
+    job_ran = gjl.last_runs(with_data=False)  # Only timestamps are needed.
     for job in graph:
         if job not in job_ran:
             job_ran[job] = LastRun(timestamp=None, data=None)
 
-    # Set all nodes good, then trace inherited out of dateness across the
-    # graph, to avoid setting a node out of date then reaching it by another
-    # route and setting it ok.
+    stale = stale_jobs(graph, job_ran)
     status = {}
     for node_id in graph:
-        status[node_id] = True
+        status[node_id] = node_id not in stale
         node = graph.get_node(node_id)
-        node.attr["fillcolor"] = FILL_GOOD
+        node.attr["fillcolor"] = FILL_BAD if node_id in stale else FILL_GOOD
         node.attr["style"] = "filled"
-        node.attr["run_at"] = (
-            job_ran[node_id].timestamp if job_ran[node_id].timestamp else "NEVER"
-        )
-
-    in_degree = dict(zip(graph, graph.in_degree()))
-    heads = [i for i in graph if in_degree[i] == 0]
-    for head in heads:
-        recurse_status(
-            graph, status, head, job_ran, ok=job_ran[head].timestamp is not None
-        )
+        node.attr["run_at"] = str(job_ran[node_id].timestamp or "NEVER")
     return status
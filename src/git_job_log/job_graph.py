@@ -0,0 +1,152 @@
+"""Pure Python job dependency graph.
+
+Enough of the pygraphviz.AGraph interface for graph_jobs' status, squash and
+annotation logic, kept in adjacency dicts so status checks on large DAGs are fast
+and don't need graphviz installed.  Convert with to_agraph() to render.
+"""
+
+import sys
+from collections.abc import Iterator
+from typing import Self
+
+
+class Node(str):
+    """A node ID with its attribute dict, like pygraphviz.Node."""
+
+    attr: dict
+
+    def __new__(cls, node_id: str, attr: dict) -> Self:
+        """Bind node_id to attr."""
+        node = super().__new__(cls, node_id)
+        node.attr = attr
+        return node
+
+
+class Edge(tuple):
+    """A (parent, child) edge with its attribute dict, like pygraphviz.Edge."""
+
+    attr: dict
+
+    def __new__(cls, parent: str, child: str, attr: dict) -> Self:
+        """Bind (parent, child) to attr."""
+        edge = super().__new__(cls, (parent, child))
+        edge.attr = attr
+        return edge
+
+
+class JobGraph:
+    """Directed graph of job IDs with graphviz style attributes."""
+
+    def __init__(self, edges: list[tuple[str, str]] | None = None):
+        """Empty graph or graph from edge list."""
+        self._succ = {}  # node -> {child: edge attrs}
+        self._pred = {}  # node -> {parent: None}
+        self._node_attr = {}  # node -> attrs
+        self.graph_attr = {}
+        self.node_attr = {}  # Defaults for all nodes.
+        self.edge_attr = {}  # Defaults for all edges.
+        for edge in edges or []:
+            self.add_edge(*edge)
+
+    def __iter__(self) -> Iterator[str]:
+        """Nodes in insertion order."""
+        return iter(self._succ)
+
+    def __len__(self) -> int:
+        """Number of nodes."""
+        return len(self._succ)
+
+    def __contains__(self, node_id: str) -> bool:
+        """Is node_id in graph."""
+        return node_id in self._succ
+
+    def iternodes(self) -> Iterator[Node]:
+        """Iterate Nodes, a snapshot so nodes can be removed while iterating."""
+        return (self.get_node(node_id) for node_id in list(self._succ))
+
+    def nodes(self) -> list[str]:
+        """List of node IDs."""
+        return list(self._succ)
+
+    def edges(self) -> list[tuple[str, str]]:
+        """List of (parent, child) edges."""
+        return [(node, child) for node, kids in self._succ.items() for child in kids]
+
+    def iteredges(self) -> Iterator[Edge]:
+        """Iterate Edges."""
+        for node_id, kids in self._succ.items():
+            for child, attr in kids.items():
+                yield Edge(node_id, child, attr)
+
+    def add_node(self, node_id: str, **attr) -> None:
+        """Add a node if not present, update its attributes."""
+        if node_id not in self._succ:
+            node_id = sys.intern(str(node_id))
+            self._succ[node_id] = {}
+            self._pred[node_id] = {}
+            self._node_attr[node_id] = {}
+        self._node_attr[node_id].update(attr)
+
+    def add_edge(self, u: str | tuple, v: str | None = None, **attr) -> None:
+        """Add edge u -> v, or u[0] -> u[1] like pygraphviz."""
+        if v is None:
+            u, v = u
+        self.add_node(u)
+        self.add_node(v)
+        self._succ[u].setdefault(v, {}).update(attr)
+        self._pred[v][u] = None
+
+    def remove_node(self, node_id: str) -> None:
+        """Remove node and its edges."""
+        for child in self._succ.pop(node_id):
+            del self._pred[child][node_id]
+        for parent in self._pred.pop(node_id):
+            del self._succ[parent][node_id]
+        del self._node_attr[node_id]
+
+    def get_node(self, node_id: str) -> Node:
+        """Node with .attr dict."""
+        return Node(node_id, self._node_attr[node_id])
+
+    def successors(self, node_id: str) -> list[str]:
+        """Children of node."""
+        return list(self._succ[node_id])
+
+    out_neighbors = successors
+
+    def predecessors(self, node_id: str) -> list[str]:
+        """Parents of node."""
+        return list(self._pred[node_id])
+
+    in_neighbors = predecessors
+
+    def in_degree(self, node_id: str | None = None) -> int | list[int]:
+        """In degree of node, or list of in degrees of all nodes."""
+        if node_id is None:
+            return [len(parents) for parents in self._pred.values()]
+        return len(self._pred[node_id])
+
+    def out_degree(self, node_id: str | None = None) -> int | list[int]:
+        """Out degree of node, or list of out degrees of all nodes."""
+        if node_id is None:
+            return [len(kids) for kids in self._succ.values()]
+        return len(self._succ[node_id])
+
+    def to_agraph(self):
+        """pygraphviz.AGraph copy of this graph for rendering."""
+        import pygraphviz as pgv  # Only needed for rendering.
+
+        agraph = pgv.AGraph(directed=True)
+        agraph.graph_attr.update(_text(self.graph_attr))
+        agraph.node_attr.update(_text(self.node_attr))
+        agraph.edge_attr.update(_text(self.edge_attr))
+        for node_id, attr in self._node_attr.items():
+            agraph.add_node(node_id, **_text(attr))
+        for edge in self.iteredges():
+            agraph.add_edge(*edge, **_text(edge.attr))
+        return agraph
+
+
+def _text(attr: dict) -> dict:
+    """Attribute values as strings for graphviz."""
+    return {k: str(v) for k, v in attr.items()}
@@ -0,0 +1,219 @@
+"""Resident GitJobLog served over a Unix socket.
+
+    python -m git_job_log.cli serve --socket /tmp/job_log.sock
+
+keeps the local clone synced and the last run index warm, and answers requests
+from JobLogClient (or `cli.py --socket /tmp/job_log.sock list|log ...`) in
+milliseconds.  Concurrent log requests are committed together.
+
+The protocol is one JSON object per line each way, a request like
+`{"op": "last_ran", "job": "a/b"}` gets `{"ok": true, "result": ...}` or
+`{"ok": false, "error": "..."}`.  Ops are `list` (optional prefix, select,
+with_data),
+`last_ran` (job) and `log` (jobs, data).
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from git_job_log.git_job_log import GitJobLog, JobType, LastRun, _select_jobs
+
+
+class JobLogServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve a GitJobLog on a Unix socket."""
+
+    daemon_threads = True
+    request_queue_size = 128  # Pending connections, many pipeline steps at once.
+
+    def __init__(
+        self,
+        path: str | Path,
+        gjl: GitJobLog | None = None,
+        sync_interval: float = 10,  # seconds between background fetches
+        batch_delay: float = 0.1,  # seconds log requests wait for others
+        batch_size: int = 100,  # runs per commit at most
+        socket_mode: int = 0o600,  # socket file permissions, who may connect
+    ):
+        """Bind to path, replacing a stale socket file."""
+        self.path = Path(path)
+        if self.path.exists():
+            if _listening(self.path):
+                raise Exception(f"{self.path} is already being served")
+            self.path.unlink()
+        self.gjl = gjl or GitJobLog(max_staleness=sync_interval)
+        # Background sync covers reads.
+        self.gjl.max_staleness = max(self.gjl.max_staleness, sync_interval)
+        self.sync_interval = sync_interval
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self.socket_mode = socket_mode
+        self._index = (None, {})  # (HEAD, run index) cache.
+        self._index_lock = threading.Lock()
+        self._stop = threading.Event()
+        super().__init__(str(self.path), _Handler)
+
+    def server_bind(self) -> None:
+        """Bind, and set the socket's permissions before it accepts connections."""
+        super().server_bind()
+        os.chmod(self.server_address, self.socket_mode)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        """Serve until shutdown(), syncing in the background."""
+        syncer = threading.Thread(target=self._syncer, daemon=True)
+        syncer.start()
+        try:
+            with self.gjl.batch(self.batch_delay, self.batch_size):
+                super().serve_forever(poll_interval)
+        finally:
+            self._stop.set()
+            syncer.join()
+            self.server_close()
+
+    def server_close(self) -> None:
+        """Close and remove the socket."""
+        super().server_close()
+        self.path.unlink(missing_ok=True)
+        self.gjl.close()
+
+    def run_index(self) -> dict:
+        """GitJobLog.run_index(), loaded once per HEAD."""
+        self.gjl.pull()
+        with self._index_lock, self.gjl._lock(exclusive=False):
+            head = self.gjl._head()
+            if self._index[0] != head or head is None:
+                self._index = (head, self.gjl.run_index())
+            return self._index[1]
+
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """{job: LastRun} for all jobs or a selection, only selected data is read."""
+        index = _select_jobs(self.run_index(), prefix, select)
+        return self._last_runs(index, with_data)
+
+    def last_ran(self, job: JobType) -> LastRun:
+        """LastRun info. for this job, only its data is read."""
+        index = self.run_index()
+        runs = self._last_runs({job: index[job]} if job in index else {}, True)
+        return runs.get(job, LastRun(None, None))
+
+    def _last_runs(self, index: dict, with_data: bool) -> dict:
+        """LastRuns for run index entries, reading their data if with_data."""
+        with self.gjl._lock(exclusive=False):
+            return self.gjl._drive(self.gjl._last_runs_steps(index, with_data))
+
+    def handle_request_data(self, request: dict):
+        """Result for a decoded request."""
+        op = request.get("op")
+        if op == "list":
+            runs = self.last_runs(
+                request.get("prefix"),
+                request.get("select"),
+                request.get("with_data", True),
+            )
+            return {job: _run_json(run) for job, run in runs.items()}
+        if op == "last_ran":
+            return _run_json(self.last_ran(request["job"]))
+        if op == "log":
+            self.gjl.log_run(request["jobs"], request.get("data")).result()
+            return None
+        raise Exception(f"Unknown op {op!r}")
+
+    def _syncer(self) -> None:
+        """Fetch and update the index every sync_interval seconds."""
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.gjl.pull(force=True)
+                self.run_index()
+            except Exception as exc:  # noqa:BLE001 - keep serving, retry next time
+                print(f"git_job_log serve: sync failed: {exc}", file=sys.stderr)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One client connection, any number of requests."""
+
+    def handle(self) -> None:
+        """Answer request lines until the client disconnects."""
+        for line in self.rfile:
+            try:
+                result = self.server.handle_request_data(json.loads(line))
+                response = {"ok": True, "result": result}
+            except Exception as exc:  # noqa:BLE001 - reported to the client
+                response = {"ok": False, "error": str(exc)}
+            self.wfile.write(json.dumps(response, default=str).encode("utf8") + b"\n")
+
+
+class JobLogClient:
+    """Thin client for a JobLogServer, same read / log API as GitJobLog."""
+
+    def __init__(self, path: str | Path, timeout: float | None = 60):
+        """Client for the server listening on path."""
+        self.path = str(path)
+        self.timeout = timeout
+
+    def request(self, request: dict):
+        """Send one request, return its result or raise its error."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(json.dumps(request).encode("utf8") + b"\n")
+            with sock.makefile("rb") as response:
+                response = json.loads(response.readline())
+        if not response["ok"]:
+            raise Exception(response["error"])
+        return response["result"]
+
+    def last_runs(
+        self,
+        prefix: str | None = None,
+        select: list[str] | None = None,
+        with_data: bool = True,
+    ) -> dict:
+        """{job: LastRun} for all jobs, or a selection as for GitJobLog.last_runs()."""
+        request = {
+            "op": "list",
+            "prefix": prefix,
+            "select": select,
+            "with_data": with_data,
+        }
+        return {job: _json_run(run) for job, run in self.request(request).items()}
+
+    def last_ran(self, job: JobType) -> LastRun:
+        """LastRun info. for this job."""
+        return _json_run(self.request({"op": "last_ran", "job": job}))
+
+    def log_run(self, jobs: list[JobType] | JobType, data=None) -> None:
+        """Log a run of jobs, returns once pushed."""
+        if isinstance(jobs, str):
+            jobs = [jobs]
+        self.request({"op": "log", "jobs": list(jobs), "data": data})
+
+
+def _listening(path: Path) -> bool:
+    """Is something accepting connections on socket path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def _run_json(run: LastRun) -> list:
+    """LastRun as JSON-able [timestamp, data]."""
+    return [run.timestamp.isoformat() if run.timestamp else None, run.data]
+
+
+def _json_run(run: list) -> LastRun:
+    """LastRun from _run_json() output."""
+    when, data = run
+    return LastRun(timestamp=when and datetime.fromisoformat(when), data=data)
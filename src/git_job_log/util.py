@@ -1,5 +1,10 @@
 """Utility functions for slash/separated/job/names."""
 import re
+from collections import defaultdict
+from collections.abc import Hashable, Iterable, Sequence
+
+# Characters that make a word a regex rather than a literal prefix.
+REGEX_CHARS = frozenset(".^$*+?{}[]\\|()")
 
 
 def split_job(job_name: str) -> list[str]:
@@ -29,3 +34,48 @@ def job_match(job_name: str, words: list[str]) -> bool:
             del job_words[0]  # Try and match words further down the job_name
 
     return False
+
+
+class JobMatcher:
+    """Match job names against many word lists at once, same rules as job_match().
+
+    Patterns are compiled once, and patterns whose first word is a literal are
+    indexed by it so each job word is only tested against plausible patterns.
+    """
+
+    def __init__(self, patterns: Iterable[Sequence[str]]):
+        """Compile patterns, e.g. the keys of an annotate_graph() description."""
+        self.patterns = list(patterns)
+        self._compiled = [
+            [re.compile(text) for text in words] for words in self.patterns
+        ]
+        self._literal = defaultdict(list)  # Literal first word -> pattern indices.
+        self._other = []  # Indices of patterns starting with a regex.
+        for pattern_i, words in enumerate(self.patterns):
+            if words and not REGEX_CHARS.intersection(words[0]):
+                self._literal[words[0]].append(pattern_i)
+            else:
+                self._other.append(pattern_i)
+        self._lengths = sorted({len(first) for first in self._literal})
+
+    def match(self, job_name: str) -> list[Hashable]:
+        """Patterns matching job_name, in the order given."""
+        job_words = split_job(job_name)
+        found = set()
+        for offset, first in enumerate(job_words):
+            candidates = list(self._other)
+            for length in self._lengths:
+                if length > len(first):
+                    break
+                # re.match() of a literal is a prefix test.
+                candidates.extend(self._literal.get(first[:length], ()))
+            for pattern_i in candidates:
+                words = self._compiled[pattern_i]
+                if pattern_i in found or len(words) > len(job_words) - offset:
+                    continue
+                if all(
+                    text.match(job_words[offset + word_i])
+                    for word_i, text in enumerate(words)
+                ):
+                    found.add(pattern_i)
+        return [self.patterns[pattern_i] for pattern_i in sorted(found)]
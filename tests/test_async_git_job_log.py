@@ -0,0 +1,108 @@
+"""Tests for async_git_job_log."""
+
+import asyncio
+import shutil
+
+from git_job_log import AsyncGitJobLog, GitJobLog
+
+
+def test_log_and_read(random_remote):
+    """Test concurrent async logging and reading."""
+
+    async def run():
+        async with AsyncGitJobLog(random_remote) as gjl:
+            await asyncio.gather(*(gjl.log_run([f"a/{i}"], {"i": i}) for i in range(4)))
+            job_ran, last = await asyncio.gather(gjl.last_runs(), gjl.last_ran("a/2"))
+            assert set(job_ran) == {f"a/{i}" for i in range(4)}
+            assert last.data == {"i": 2}
+            assert (await gjl.last_ran("no/job")).timestamp is None
+            await asyncio.sleep(1)
+            await gjl.log_run(["a/2"], {"i": 2})  # Same data, new commit.
+            assert (await gjl.last_ran("a/2")).timestamp > last.timestamp
+            return gjl
+
+    gjl = asyncio.run(run())
+    # Same clone and index as the sync. API.
+    assert set(GitJobLog(random_remote).last_runs()) == {f"a/{i}" for i in range(4)}
+
+    shutil.rmtree(gjl.local)
+
+
+def test_coalesced_pull(random_remote):
+    """Test concurrent pulls share one fetch."""
+
+    async def run():
+        gjl = AsyncGitJobLog(random_remote)
+        await gjl.log_run(["a/1"])
+        fetches = []
+        fetch = gjl._fetch
+
+        async def counted_fetch(**kwargs):
+            fetches.append(1)
+            await fetch(**kwargs)
+
+        gjl._fetch = counted_fetch
+        results = await asyncio.gather(*(gjl.last_runs() for _ in range(5)))
+        assert all(set(i) == {"a/1"} for i in results)
+        assert len(fetches) == 1
+        return gjl
+
+    gjl = asyncio.run(run())
+
+    shutil.rmtree(gjl.local)
+
+
+def test_metrics(random_remote):
+    """Test commands run concurrently are attributed to their operation."""
+    events = []
+
+    async def run():
+        gjl = AsyncGitJobLog(random_remote, on_command=events.append)
+        await gjl.log_run(["a/1"])
+        await asyncio.gather(gjl.last_runs(), gjl.last_ran("a/1"))
+        return gjl
+
+    gjl = asyncio.run(run())
+    commands = {(i.operation, i.command) for i in events}
+    assert ("log_run", "push") in commands
+    assert ("last_runs", "cat-file") in commands
+    assert ("last_ran", "cat-file") in commands
+
+    shutil.rmtree(gjl.local)
+
+
+def test_last_runs_selected(random_remote):
+    """Test last_runs(prefix, select) without an on-disk index."""
+
+    async def run():
+        async with AsyncGitJobLog(random_remote) as gjl:
+            await gjl.log_run(["a/b/1", "a/c/2", "d/b/3"])
+            gjl.gjl.index_path().unlink(missing_ok=True)
+            assert set(await gjl.last_runs("a")) == {"a/b/1", "a/c/2"}
+            assert set(await gjl.last_runs(select=["b"])) == {"a/b/1", "d/b/3"}
+            assert set(await gjl.last_runs("a", ["b"])) == {"a/b/1"}
+            assert not gjl.gjl.index_path().exists()
+            return gjl
+
+    gjl = asyncio.run(run())
+
+    shutil.rmtree(gjl.local)
+
+
+def test_missing_blob(random_remote):
+    """Test a RUN blob missing from the clone reads as None, as in GitJobLog."""
+
+    async def run():
+        async with AsyncGitJobLog(random_remote) as gjl:
+            await gjl.log_run(["a/1"])
+            await gjl.run_index()
+            head, index = gjl.gjl._read_index()
+            when, _ = index["a/1"]
+            gjl.gjl._write_index(head, {"a/1": (when, "0" * 40)})
+            assert await gjl.last_ran("a/1") == (when, None)
+            assert gjl.gjl.last_ran("a/1") == (when, None)
+            return gjl
+
+    gjl = asyncio.run(run())
+
+    shutil.rmtree(gjl.local)
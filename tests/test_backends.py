@@ -0,0 +1,113 @@
+"""Conformance tests for all JobLogBackends."""
+
+import shutil
+import time
+from datetime import timedelta
+
+import pytest
+
+from git_job_log import (
+    GitJobLog,
+    JobLogBackend,
+    LastRun,
+    MemoryJobLog,
+    SqliteJobLog,
+    graph_jobs,
+    open_job_log,
+)
+
+
+@pytest.fixture(params=["git", "memory", "sqlite"])
+def job_log(request, random_remote, tmp_path):
+    """Each kind of JobLogBackend, empty."""
+    if request.param == "git":
+        job_log = GitJobLog(random_remote)
+    elif request.param == "memory":
+        job_log = open_job_log("memory:")
+    else:
+        job_log = open_job_log(f"sqlite:{tmp_path / 'job_log.db'}")
+    with job_log:
+        yield job_log
+    if request.param == "git":
+        shutil.rmtree(job_log.local)
+
+
+def test_factory(tmp_path):
+    """Test open_job_log() picks the backend."""
+    assert isinstance(open_job_log("memory:"), MemoryJobLog)
+    with open_job_log(f"sqlite:{tmp_path / 'job_log.db'}") as job_log:
+        assert isinstance(job_log, SqliteJobLog)
+    assert issubclass(GitJobLog, JobLogBackend)
+    with pytest.raises(TypeError, match="abstract"):
+        JobLogBackend()
+
+
+def test_empty(job_log):
+    """Test reads before anything is logged."""
+    assert job_log.last_runs() == {}
+    assert job_log.last_ran("a/1") == LastRun(None, None)
+    assert list(job_log.run_history("a/1")) == []
+
+
+def test_log_and_read(job_log):
+    """Test data reads back as GitJobLog stores it."""
+    job_log.log_run(["a/1", "a/2/"], {"v": 1})
+    job_log.log_run(["b/1"], "text")
+    job_log.log_run(["b/2"])
+    job_ran = job_log.last_runs()
+    assert set(job_ran) == {"a/1", "a/2", "b/1", "b/2"}
+    assert job_ran["a/1"].data == {"v": 1}
+    assert job_ran["b/1"].data == "text"
+    assert job_ran["b/2"].data == ""
+    assert job_log.last_ran("a/2") == job_ran["a/2"]
+    assert job_log.last_ran("a").timestamp is None
+    assert job_log.last_ran("a/1", with_data=False).data is None
+    assert all(i.data is None for i in job_log.last_runs(with_data=False).values())
+
+
+def test_last_ran_one_job(job_log, monkeypatch):
+    """Test last_ran() of a job with jobs under it reads just that job."""
+    job_log.log_run(["a", "a/1", "a/2"], {"v": 1})
+    monkeypatch.setattr(job_log, "last_runs", None)  # Not used.
+    assert job_log.last_ran("a").data == {"v": 1}
+    assert job_log.last_ran("a/1", with_data=False).data is None
+    assert job_log.last_ran("a/3") == LastRun(None, None)
+
+
+def test_selection(job_log):
+    """Test last_runs(prefix, select)."""
+    jobs = ["home/yard/lawn/mow", "home/yard/fence/paint", "work/commute/pass/renew"]
+    job_log.log_run(jobs)
+    assert set(job_log.last_runs("home/yard/")) == set(jobs[:2])
+    assert set(job_log.last_runs("home/ya")) == set()
+    assert set(job_log.last_runs(select=["(lawn|pass)", "r.*"])) == {jobs[2]}
+    assert set(job_log.last_runs("home", ["f"])) == {jobs[1]}
+
+
+def test_history(job_log):
+    """Test run_history() and later runs replacing last runs."""
+    job_log.log_run(["a/1", "a/2"], {"v": 0})
+    time.sleep(1)  # GitJobLog times have 1s resolution.
+    job_log.log_run(["a/1"], {"v": 1})
+    first, last = job_log.last_ran("a/2"), job_log.last_ran("a/1")
+    assert last.timestamp > first.timestamp
+    assert last.data == {"v": 1}
+    history = list(job_log.run_history("a/1"))
+    assert [run.data for run in history] == [{"v": 1}, {"v": 0}]
+    assert [run.timestamp for run in history] == [last.timestamp, first.timestamp]
+    assert history[0].commit != history[1].commit
+    assert [run.data for run in job_log.run_history("a/1", limit=1)] == [{"v": 1}]
+    since = last.timestamp - timedelta(seconds=0.5)
+    assert [run.data for run in job_log.run_history("a/1", since=since)] == [{"v": 1}]
+    until = first.timestamp + timedelta(seconds=0.5)
+    assert [run.data for run in job_log.run_history("a/1", until=until)] == [{"v": 0}]
+
+
+def test_add_status(job_log):
+    """Test graph status from any backend."""
+    graph = graph_jobs.make_graph([("a/1", "a/2"), ("a/2", "a/3")])
+    job_log.log_run(["a/1", "a/2"])
+    time.sleep(1)
+    job_log.log_run(["a/1"])
+    status = graph_jobs.add_status(graph, job_log)
+    assert status == {"a/1": True, "a/2": False, "a/3": False}
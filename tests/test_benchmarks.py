@@ -0,0 +1,25 @@
+"""Smoke test for benchmarks/bench.py."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH = Path(__file__).parents[1] / "benchmarks" / "bench.py"
+
+
+def test_bench(tmp_path):
+    """Test the benchmarks run on a tiny synthetic repo. and can be compared."""
+    args = ["--jobs", "30", "--commits", "20", "--width", "5", "--repeat", "1"]
+    cmd = [sys.executable, BENCH, *args, "--workdir", tmp_path / "work"]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True)  # noqa:S603
+    results = [json.loads(line) for line in proc.stdout.splitlines()]
+    names = {i["benchmark"] for i in results}
+    assert {"generate", "clone", "last_runs", "log_run", "add_status"} <= names
+    assert all(i["min"] >= 0 and i["jobs"] == 30 for i in results)  # noqa:PLR2004
+
+    before = tmp_path / "before.jsonl"
+    before.write_text(proc.stdout)
+    cmd = [sys.executable, BENCH, *args, "--compare", before]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True)  # noqa:S603
+    assert "ratio" in proc.stderr
@@ -1,15 +1,26 @@
 """Tests for git_job_log."""
 
 import hashlib
+import json
+import pickle
 import shutil
+import subprocess
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
 import pytest
 
-from git_job_log import GitJobLog
-from git_job_log.git_job_log import GIT_JOB_LOG_DATA_DIR, GIT_JOB_LOG_RUN_FILE
+from git_job_log import GitJobLog, MetricsSink
+from git_job_log.git_job_log import (
+    GIT_JOB_LOG_DATA_DIR,
+    GIT_JOB_LOG_RUN_FILE,
+    LastRun,
+    LockTimeout,
+    _Sleep,
+)
 
 
 def test_local_path(random_remote):
@@ -27,10 +38,12 @@ def test_log_run(random_remote):
     "Test logging a run."
     gjl = GitJobLog(random_remote)
     job = "a/job"
-    job_file = gjl.local / job / GIT_JOB_LOG_RUN_FILE
-    assert not job_file.exists()
+    run_file = f"HEAD:{job}/{GIT_JOB_LOG_RUN_FILE}"
+    assert gjl._run(["git", "-C", gjl.local, "cat-file", "-e", run_file]).returncode
     gjl.log_run([job])
-    assert job_file.exists()
+    assert not gjl._run(["git", "-C", gjl.local, "cat-file", "-e", run_file]).returncode
+    # Committed with plumbing, nothing written to the working tree.
+    assert not (gjl.local / job).exists()
 
     shutil.rmtree(gjl.local)
 
@@ -41,10 +54,12 @@ def test_last_ran(random_remote, what):
     gjl = GitJobLog(random_remote)
     job = "this/job/here"
     gjl.log_run([job], what)
-    job_file = gjl.local / job / GIT_JOB_LOG_RUN_FILE
+    run_file = f"HEAD:{job}/{GIT_JOB_LOG_RUN_FILE}"
     last_ran = gjl.last_ran(job)
     # Jobs logged with data=None will report ""
-    assert last_ran.data == (what or ""), job_file.read_text()
+    assert last_ran.data == (what or ""), gjl._do_cmd(
+        ["git", "-C", gjl.local, "show", run_file]
+    )
     assert 0 <= (datetime.now(tz=timezone.utc) - last_ran.timestamp).total_seconds() < 3
 
     shutil.rmtree(gjl.local)
@@ -109,3 +124,549 @@ def test_repeated(random_remote):
     assert job_ran["2/3"].timestamp == job_ran["2/3/4"].timestamp
 
     shutil.rmtree(gjl.local)
+
+
+def test_last_runs_matches_last_ran(random_remote):
+    """Test the single history walk agrees with per-job lookups."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1", "a/2"], {"n": 1})
+    time.sleep(1)
+    gjl.log_run(["a/2", "b/3"], "text")
+
+    job_ran = gjl.last_runs()
+
+    assert set(job_ran) == {"a/1", "a/2", "b/3"}
+    for job, run in job_ran.items():
+        assert run == gjl.last_ran(job)
+    assert job_ran["a/1"].timestamp < job_ran["a/2"].timestamp
+    assert job_ran["a/2"].timestamp == job_ran["b/3"].timestamp
+
+    shutil.rmtree(gjl.local)
+
+
+def test_run_index(random_remote):
+    """Test the on-disk last run index is reused, updated and rebuilt."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1", "a/2"])
+    first = gjl.last_runs()
+    cached = json.loads(gjl.index_path().read_text())
+    assert set(cached["jobs"]) == {"a/1", "a/2"}
+
+    time.sleep(1)
+    gjl.log_run(["a/2", "b/3"])
+    time.sleep(1)
+    gjl.log_run(["a/2"])
+    head = gjl._do_cmd(["git", "-C", gjl.local, "rev-parse", "HEAD"]).strip()
+    updated = gjl.last_runs()
+    assert json.loads(gjl.index_path().read_text())["head"] == head
+    assert updated["a/1"] == first["a/1"]
+    assert updated["a/2"].timestamp > first["a/2"].timestamp
+    assert set(updated) == {"a/1", "a/2", "b/3"}
+    assert gjl.run_index() == gjl._drive(gjl._build_index_steps(head))
+
+    gjl.index_path().write_text("{not json")
+    assert gjl.last_runs() == updated
+
+    shutil.rmtree(gjl.local)
+
+
+def test_max_staleness(random_remote):
+    """Test reads within max_staleness don't fetch, writes always do."""
+    writer = GitJobLog(random_remote)
+    # Different URL for the same remote, so a separate local clone.
+    reader = GitJobLog(f"file://{random_remote}", max_staleness=3600)
+    assert reader.local != writer.local
+    writer.log_run(["a/1"])
+    reader.pull(force=True)
+    assert set(reader.last_runs()) == {"a/1"}
+
+    writer.log_run(["b/2"])
+    assert set(reader.last_runs()) == {"a/1"}  # Within window, not fetched.
+    reader.pull(force=True)
+    assert set(reader.last_runs()) == {"a/1", "b/2"}
+
+    reader.log_run(["c/3"])  # Writes sync. first, so b/2 isn't lost.
+    assert set(writer.last_runs()) == {"a/1", "b/2", "c/3"}
+
+    shutil.rmtree(writer.local)
+    shutil.rmtree(reader.local)
+
+
+def test_queued_pulls_share_fetch(random_remote):
+    """Test readers waiting for the lock don't repeat a fetch made meanwhile."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1"])
+    events = []
+    readers = [GitJobLog(random_remote, on_command=events.append) for _ in range(3)]
+    with ThreadPoolExecutor(len(readers)) as pool:
+        with gjl._lock(exclusive=True):
+            waiting = [pool.submit(reader.pull) for reader in readers]
+            time.sleep(0.5)  # All queued for the lock.
+            gjl.pull(force=True)
+        for future in waiting:
+            future.result()
+    assert "fetch" not in [i.command for i in events]
+    readers[0].pull()  # Not waiting, fetches.
+    assert "fetch" in [i.command for i in events]
+
+    shutil.rmtree(gjl.local)
+
+
+def test_repeated_data(random_remote):
+    """Test repeated logging with unchanged data generates new commits."""
+    gjl = GitJobLog(random_remote)
+    job = "a/job"
+    for _ in range(3):
+        gjl.log_run([job], "same data")
+        time.sleep(1)
+    count = gjl._do_cmd(["git", "-C", gjl.local, "rev-list", "--count", "HEAD"])
+    assert int(count) == 3
+    assert gjl.last_ran(job).data.startswith("same data")
+
+    shutil.rmtree(gjl.local)
+
+
+def test_batch(random_remote):
+    """Test batched log_run() calls from many threads share one commit."""
+    gjl = GitJobLog(random_remote)
+    jobs = [f"batch/{i}" for i in range(10)]
+    with gjl.batch(max_delay=60, max_size=len(jobs)):
+        with ThreadPoolExecutor(4) as pool:
+            done = list(pool.map(lambda job: gjl.log_run([job], {"job": job}), jobs))
+        for future in done:
+            future.result(timeout=60)
+    count = gjl._do_cmd(["git", "-C", gjl.local, "rev-list", "--count", "HEAD"])
+    assert int(count) == 1
+
+    job_ran = gjl.last_runs()
+    assert set(job_ran) == set(jobs)
+    assert all(job_ran[job].data == {"job": job} for job in jobs)
+
+    time.sleep(1)
+    with gjl.batch(max_delay=0.1):
+        first = gjl.log_run(["batch/0"])
+        time.sleep(1.5)
+        second = gjl.log_run(["batch/1"])
+    first.result()
+    second.result()
+    count = gjl._do_cmd(["git", "-C", gjl.local, "rev-list", "--count", "HEAD"])
+    assert int(count) == 3  # max_delay elapsed between them
+
+    shutil.rmtree(gjl.local)
+
+
+def test_push_retry(random_remote):
+    """Test a rejected push is re-applied on the new tip and retried."""
+    first = GitJobLog(random_remote)
+    second = GitJobLog(f"file://{random_remote}")
+    first.log_run(["a/1"])
+    second.pull(force=True)
+    first.log_run(["a/2"])
+
+    real_fetch = second._fetch_steps
+    skipped = []
+
+    def stale_fetch():
+        """Miss the first sync. so second's push is based on an old tip."""
+        if not skipped:
+            skipped.append(True)
+            return
+        yield from real_fetch()
+
+    second._fetch_steps = stale_fetch
+    real_step, held = second._step, []
+
+    def step(step):
+        """Note if the lock is held while backing off."""
+        if isinstance(step, _Sleep):
+            held.append(getattr(second._held, "mode", None))
+        return real_step(step)
+
+    second._step = step
+    second.log_run(["a/3"])
+    assert second.push_stats["rejected"] == 1
+    assert second.push_stats["retries"] == 1
+    assert held == [None]  # Other writers can get in.
+    assert set(first.last_runs()) == {"a/1", "a/2", "a/3"}
+
+    shutil.rmtree(first.local)
+    shutil.rmtree(second.local)
+
+
+def test_no_jobs(random_remote):
+    """Test logging no jobs raises without fetching or pushing."""
+    gjl = GitJobLog(random_remote)
+    events = []
+    gjl.on_command = events.append
+    with pytest.raises(Exception, match="no jobs given"):
+        gjl.log_run([])
+    assert events == []
+
+    shutil.rmtree(gjl.local)
+
+
+def test_log_run_reads_logged_jobs_only(random_remote):
+    """Test logging doesn't scan history or index jobs that weren't logged."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1", "b/1"])
+    before = gjl.last_runs()
+    events = []
+    gjl.on_command = events.append
+    time.sleep(1)
+    gjl.log_run(["a/1"])
+    assert "log" not in [i.command for i in events]
+    after = gjl.last_runs()
+    assert after["a/1"].timestamp > before["a/1"].timestamp
+    assert after["b/1"] == before["b/1"]
+
+    shutil.rmtree(gjl.local)
+
+
+def test_failed_commit_keeps_branch(random_remote, tmp_path, monkeypatch):
+    """Test a failed commit-tree raises, never pushing an empty refspec."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1"])
+    # No identity: commit-tree fails.
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(tmp_path / "no_gitconfig"))
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    for var in ("AUTHOR", "COMMITTER"):
+        for part in ("NAME", "EMAIL"):
+            monkeypatch.delenv(f"GIT_{var}_{part}", raising=False)
+    gjl.git_config.pop("user.name", None)  # Set in Docker.
+    gjl.git_config.pop("user.email", None)
+    gjl.git_config["user.useConfigOnly"] = "true"
+    with pytest.raises(Exception, match="commit-tree"):
+        gjl.log_run(["a/2"])
+    assert gjl.push_stats["pushes"] == 1
+    heads = gjl._do_cmd(["git", "ls-remote", "--heads", random_remote])
+    assert "refs/heads/job_logs" in heads
+
+    shutil.rmtree(gjl.local)
+
+
+def test_push_failure_not_retried(random_remote, tmp_path):
+    """Test a push failing for reasons other than rejection isn't retried."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1"])
+    missing = tmp_path / "missing"
+    gjl._do_cmd(["git", "-C", gjl.local, "remote", "set-url", "origin", missing])
+    with pytest.raises(Exception, match="does not appear to be a git repository"):
+        gjl.log_run(["a/2"])
+    assert gjl.push_stats["retries"] == 0
+    assert gjl.push_stats["failures"] == 1
+
+    shutil.rmtree(gjl.local)
+
+
+def test_concurrent_writers(random_remote):
+    """Test several writers with their own clones all get their runs logged."""
+    # Distinct URLs for the same remote give each writer its own clone.
+    writers = [GitJobLog(f"{random_remote}/" + "./" * i) for i in range(6)]
+
+    def log(writer_i):
+        for run_i in range(3):
+            writers[writer_i].log_run([f"w{writer_i}/r{run_i}"])
+
+    with ThreadPoolExecutor(len(writers)) as pool:
+        list(pool.map(log, range(len(writers))))
+
+    assert len(writers[0].last_runs()) == 18
+    assert not sum(writer.push_stats["failures"] for writer in writers)
+
+    for writer in writers:
+        shutil.rmtree(writer.local)
+
+
+def test_lock(random_remote):
+    """Test readers share the local clone lock and writers time out cleanly."""
+    holder = GitJobLog(random_remote)
+    holder.log_run(["a/1"])
+    other = GitJobLog(random_remote, max_staleness=3600, lock_timeout=0.5)
+    assert other.local == holder.local
+
+    with holder._lock(exclusive=False):
+        assert set(other.last_runs()) == {"a/1"}  # Readers don't block.
+        start = time.monotonic()
+        with pytest.raises(LockTimeout):
+            other.log_run(["a/2"])
+        assert time.monotonic() - start < 5
+
+    other.log_run(["a/2"])
+    assert set(holder.last_runs()) == {"a/1", "a/2"}
+
+    shutil.rmtree(holder.local)
+
+
+def test_cat_file(random_remote):
+    """Test RUN data is read by one reused, restartable cat-file process."""
+    with GitJobLog(random_remote) as gjl:
+        gjl.log_run(["a/1", "a/2"], {"v": 1})
+        time.sleep(1)
+        gjl.log_run(["a/2"], {"v": 2})
+        assert gjl.last_runs()["a/2"].data == {"v": 2}
+        pid = gjl.cat_file.proc.pid
+        assert gjl.last_runs()["a/1"].data == {"v": 1}
+        assert gjl.cat_file.proc.pid == pid
+
+        assert gjl.data_at("a/2", "HEAD~1") == {"v": 1}
+        assert gjl.data_at("a/2") == {"v": 2}
+        assert gjl.data_at("no/job") is None
+
+        gjl.cat_file.proc.kill()
+        gjl.cat_file.proc.wait()
+        assert gjl.last_ran("a/1").data == {"v": 1}
+        assert gjl.cat_file.proc.pid != pid
+    assert gjl.cat_file.proc is None
+
+    shutil.rmtree(gjl.local)
+
+
+def test_run_history(random_remote):
+    """Test streaming past runs of a job."""
+    with GitJobLog(random_remote) as gjl:
+        assert list(gjl.run_history("a/1")) == []
+        for i in range(3):
+            gjl.log_run(["a/1"], {"v": i})
+            gjl.log_run(["b/1"], {"v": i})
+            time.sleep(1)
+        history = list(gjl.run_history("a/1"))
+        assert [run.data for run in history] == [{"v": 2}, {"v": 1}, {"v": 0}]
+        assert history[0].timestamp == gjl.last_ran("a/1").timestamp
+        assert (
+            history[0].commit
+            == gjl._do_cmd(["git", "-C", gjl.local, "rev-parse", "HEAD~1"]).strip()
+        )
+        assert history[0].timestamp > history[1].timestamp > history[2].timestamp
+
+        runs = gjl.run_history("a/1", since=history[1].timestamp)
+        assert [run.commit for run in runs] == [i.commit for i in history[:2]]
+        runs = gjl.run_history("a/1", until=history[1].timestamp, limit=1)
+        assert [run.commit for run in runs] == [history[1].commit]
+        assert [run.data for run in gjl.run_history("a/1", limit=1)] == [{"v": 2}]
+
+    shutil.rmtree(gjl.local)
+
+
+def test_metrics(random_remote):
+    """Test git commands are reported with the operation they were run for."""
+    events = []
+    metrics = MetricsSink()
+
+    def on_command(event):
+        events.append(event)
+        metrics(event)
+
+    with GitJobLog(random_remote, on_command=on_command) as gjl:
+        gjl.log_run(["a/1"], {"v": 1})
+        gjl.last_runs()
+        assert [run.data for run in gjl.run_history("a/1")] == [{"v": 1}]
+    commands = {(i.operation, i.command) for i in events}
+    assert ("get_or_create_local", "clone") in commands
+    assert ("log_run", "push") in commands
+    assert ("log_run", "commit-tree") in commands
+    assert ("last_runs", "fetch") in commands
+    assert ("last_runs", "cat-file") in commands
+    assert ("run_history", "log") in commands
+    assert ("data_at", "cat-file") in commands  # run.data, read lazily.
+    assert all(i.seconds >= 0 for i in events)
+    push = next(i for i in events if i.command == "push")
+    assert push.returncode == 0
+    assert next(i for i in events if i.command == "cat-file").returncode is None
+
+    dump = {(i["operation"], i["command"]): i for i in metrics.dump()}
+    assert dump["log_run", "push"]["calls"] == 1
+    assert sum(dump["log_run", "push"]["histogram"].values()) == 1
+    assert dump["last_runs", "cat-file"]["stdout_bytes"] > 0
+    assert "push" in metrics.report()
+
+    shutil.rmtree(gjl.local)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"clone_filter": "blob:none"},
+        {"clone_depth": 1},
+        {"clone_filter": "blob:none", "clone_depth": 1, "sparse": ["a"]},
+    ],
+)
+def test_partial_clone(random_remote, options):
+    """Test blobless / shallow / sparse clones report the same last runs."""
+    # Partial clones need file:// URLs and a remote that allows filters.
+    gjl = GitJobLog(f"file://{random_remote}")
+    gjl._do_cmd(["git", "-C", random_remote, "config", "uploadpack.allowFilter", "1"])
+    gjl.log_run(["a/1", "b/1"], {"v": 1})
+    time.sleep(1)
+    gjl.log_run(["a/2"], {"v": 2})
+    time.sleep(1)
+    gjl.log_run(["a/3"], {"v": 3})
+    expected = gjl.last_runs()
+
+    events = []
+    partial = GitJobLog(f"file://{random_remote}/", on_command=events.append, **options)
+    if "clone_depth" in options:
+        assert (partial.local / ".git" / "shallow").exists()
+    if "sparse" in options:  # Only a/ jobs are read.
+        expected = {job: run for job, run in expected.items() if job.startswith("a/")}
+        expected_b1 = (None, None)
+    else:
+        expected_b1 = expected["b/1"]
+    assert partial.last_runs() == expected
+    if "clone_filter" in options:  # Missing blobs fetched at once.
+        fetches = [i for i in events if i.command == "fetch" and "--stdin" in i.argv]
+        assert len(fetches) == 1
+    if "clone_depth" in options:  # Readers deepen without moving refs.
+        deepens = [i for i in events if any(j.startswith("--deepen") for j in i.argv)]
+        assert deepens and all("--no-write-fetch-head" in i.argv for i in deepens)
+        assert partial.fetch_lock_path().exists()
+    assert partial.last_ran("b/1") == expected_b1
+    partial.log_run(["b/2"], {"v": 4})
+    first = gjl.last_ran("b/2")
+    assert first.data == {"v": 4}
+    time.sleep(1)
+    partial.log_run(["b/2"], {"v": 4})  # Same data, even if b/ isn't read.
+    assert gjl.last_ran("b/2").timestamp > first.timestamp
+
+    shutil.rmtree(gjl.local)
+    shutil.rmtree(partial.local)
+
+
+def test_cheap_construction(random_remote):
+    """Test an existing clone is used without running git or changing config."""
+    gitconfig = Path("~/.gitconfig").expanduser()
+    before = gitconfig.read_bytes() if gitconfig.exists() else None
+    events = []
+    GitJobLog(random_remote, on_command=events.append)
+    assert events  # clone
+    events.clear()
+    gjl = GitJobLog(random_remote, on_command=events.append)
+    assert events == []
+    assert (gitconfig.read_bytes() if gitconfig.exists() else None) == before
+    # Passed to each command instead.
+    safe = gjl._do_cmd(["git", "config", "--get-all", "safe.directory"])
+    assert str(gjl.local) in safe.split("\n")
+
+    shutil.rmtree(gjl.local)
+
+
+SELECT_JOBS = ["home/yard/lawn/mow", "home/yard/fence/paint", "work/commute/pass/renew"]
+
+
+@pytest.mark.parametrize(
+    ("prefix", "select", "expected", "scoped"),
+    [
+        ("home/yard", None, SELECT_JOBS[:2], True),
+        ("home/yard/", None, SELECT_JOBS[:2], True),
+        ("home/yard/lawn/mow", None, SELECT_JOBS[:1], True),
+        ("home/ya", None, [], True),
+        (None, ["yard", "fence"], SELECT_JOBS[1:2], True),
+        (None, ["commute"], SELECT_JOBS[2:], True),
+        (None, ["(lawn|pass)", "r.*"], SELECT_JOBS[2:], False),  # Regex, not a glob.
+        ("home", ["l.*"], SELECT_JOBS[:1], True),
+        ("home", ["home"], SELECT_JOBS[:2], True),
+    ],
+)
+@pytest.mark.parametrize("cold", [True, False])
+def test_last_runs_selected(random_remote, prefix, select, expected, scoped, cold):
+    """Test last_runs(prefix, select), with and without an on-disk index.
+
+    Without one only the selected part of the tree is listed, and the partial
+    index isn't saved.
+    """
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(SELECT_JOBS, "done")
+    gjl.last_runs()
+    if cold:
+        gjl.index_path().unlink()
+    events = []
+    gjl.on_command = events.append
+    job_ran = gjl.last_runs(prefix, select)
+    assert sorted(job_ran) == sorted(expected)
+    assert all(run.data == "done" for run in job_ran.values())
+    listings = [i.argv for i in events if i.command in ("ls-tree", "diff-tree")]
+    if cold and scoped:  # Listed with a pathspec.
+        assert listings
+        assert all(argv[-1] != "--" for argv in listings)
+        assert not gjl.index_path().exists()
+    else:
+        assert listings or not cold
+        assert gjl.index_path().exists()
+
+    shutil.rmtree(gjl.local)
+
+
+def test_sha256(tmp_path):
+    """Test a SHA-256 remote, including selections without an on-disk index."""
+    remote, seed = tmp_path / "remote", tmp_path / "seed"
+    for cmd in (  # Clones of an empty remote are SHA-1, so push a first commit.
+        ["git", "init", "--bare", "--object-format=sha256", remote],
+        ["git", "init", "--object-format=sha256", seed],
+        ["git", "-C", seed, "-c", "user.name=test", "-c", "user.email=test@test"]
+        + ["commit", "--allow-empty", "-m", "start"],
+        ["git", "-C", seed, "push", remote, "HEAD:refs/heads/job_logs"],
+    ):
+        subprocess.run(cmd, capture_output=True, check=True)
+    gjl = GitJobLog(remote)
+    gjl.log_run(SELECT_JOBS, "done")
+    assert sorted(gjl.last_runs()) == sorted(SELECT_JOBS)
+    for prefix, select, expected in (
+        ("home/yard", None, SELECT_JOBS[:2]),
+        (None, ["yard", "fence"], SELECT_JOBS[1:2]),
+    ):
+        gjl.index_path().unlink(missing_ok=True)
+        assert sorted(gjl.last_runs(prefix, select)) == sorted(expected)
+
+    shutil.rmtree(gjl.local)
+
+
+def test_last_runs_without_data(random_remote):
+    """Test timestamps only last_runs() and LastRun used as a tuple."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(["a/1", "a/2"], {"v": 1})
+    events = []
+    gjl.on_command = events.append
+    job_ran = gjl.last_runs(with_data=False)
+    assert set(job_ran) == {"a/1", "a/2"}
+    assert job_ran["a/1"].timestamp is not None
+    assert job_ran["a/1"].data is None
+    assert gjl.last_ran("a/1", with_data=False).data is None
+    assert "cat-file" not in [i.command for i in events]
+
+    last = gjl.last_ran("a/1")
+    when, data = last
+    assert (when, data) == (job_ran["a/1"].timestamp, {"v": 1})
+    assert last == LastRun(when, {"v": 1}) == (when, {"v": 1})
+    assert last != LastRun(when, None)
+    assert last[0] == when and len(last) == 2
+    assert pickle.loads(pickle.dumps(last)) == last
+    assert json.loads(json.dumps(last, default=str)) == [str(when), {"v": 1}]
+
+    shutil.rmtree(gjl.local)
+
+
+IMPORT_BUDGET = 0.5  # seconds, generous, importing git_job_log takes ~0.06 here
+
+
+def test_lazy_imports(random_remote):
+    """Test logging runs doesn't load graph / async / YAML code, or need graphviz."""
+    script = f"""
+import sys
+import time
+sys.modules["pygraphviz"] = None  # Make any import fail.
+start = time.perf_counter()
+import git_job_log
+print(time.perf_counter() - start)
+gjl = git_job_log.GitJobLog({str(random_remote)!r})
+gjl.log_run(["a/1"], "done")
+heavy = ["asyncio", "dotenv", "git_job_log.graph_jobs", "pygraphviz", "yaml"]
+assert not [i for i in heavy if sys.modules.get(i)], sys.modules.keys()
+assert gjl.last_ran("a/1").data == "done"
+assert git_job_log.graph_jobs.make_graph([("a/1", "a/2")])
+assert git_job_log.AsyncGitJobLog
+"""
+    proc = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    )
+    assert float(proc.stdout) < IMPORT_BUDGET
+
+    shutil.rmtree(GitJobLog(random_remote).local)
@@ -2,10 +2,16 @@
 
 import os
 import random
+import re
+import subprocess
+import sys
 import time
+from datetime import datetime, timedelta, timezone
 from itertools import chain
 
-from git_job_log import GitJobLog, graph_jobs
+import pytest
+
+from git_job_log import GitJobLog, LastRun, graph_jobs
 from git_job_log.graph_jobs import FILL_BAD, FILL_GOOD
 
 # ruff: noqa: PLR2004 - magic values are expected results
@@ -86,6 +92,17 @@ def test_graph_deps_all_done(random_remote):
     assert text.count(FILL_GOOD) == len(VERTICES)
 
 
+def test_status_reads_no_data(random_remote):
+    """Test add_status() only reads timestamps, not RUN data."""
+    events = []
+    gjl = GitJobLog(random_remote, on_command=events.append)
+    gjl.log_run(VERTICES, {"rows": list(range(1000))})
+    events.clear()
+    status = graph_jobs.add_status(graph_jobs.make_graph(DEPENDS), gjl)
+    assert all(status.values())
+    assert "cat-file" not in [i.command for i in events]
+
+
 def test_graph_deps_none_done(random_remote):
     """Test with all jobs not run."""
     gjl = GitJobLog(random_remote)
@@ -190,3 +207,222 @@ def test_graph_large(random_remote):
     if os.environ.get("GIT_JOB_LOG_SHOW_TESTS"):
         graph_jobs.make_plot(graph, "test5_large.svg", with_key=False)
     assert out_path.exists()
+
+
+class FakeJobLog:
+    """Just enough GitJobLog for add_status()."""
+
+    def __init__(self, job_ran):
+        self.job_ran = job_ran
+
+    def last_runs(self, with_data=True):
+        return dict(self.job_ran)
+
+
+def test_status_diamonds():
+    """Test staleness propagation on a deep chain of diamonds."""
+    depends = []
+    layers = 1000
+    for layer in range(layers):
+        head, tail = f"{layer}/head", f"{layer + 1}/head"
+        depends.extend([(head, f"{layer}/a"), (head, f"{layer}/b")])
+        depends.extend([(f"{layer}/a", tail), (f"{layer}/b", tail)])
+    graph = graph_jobs.make_graph(depends)
+    now = datetime.now(tz=timezone.utc)
+    job_ran = {job: LastRun(timestamp=now, data=None) for job in graph}
+    # Ran before its parent, so it and everything downstream is stale.
+    job_ran["500/b"] = LastRun(timestamp=now - timedelta(hours=1), data=None)
+
+    status = graph_jobs.add_status(graph, FakeJobLog(job_ran))
+
+    assert len(status) == 3 * layers + 1
+    stale = {job for job, ok in status.items() if not ok}
+    assert "500/b" in stale
+    assert "500/a" not in stale
+    assert "501/head" in stale
+    assert f"{layers}/head" in stale
+    # 500/b, heads 501..1000, and a + b of layers 501..999
+    assert len(stale) == 1 + (layers - 500) + 2 * (layers - 501)
+    assert graph.get_node("500/a").attr["fillcolor"] == FILL_GOOD
+    assert graph.get_node("999/a").attr["fillcolor"] == FILL_BAD
+
+
+def test_status_cycle():
+    """Test cycles are reported rather than recursed into."""
+    graph = graph_jobs.make_graph([("a", "b"), ("b", "c"), ("c", "a"), ("x", "a")])
+    now = datetime.now(tz=timezone.utc)
+    job_ran = {job: LastRun(timestamp=now, data=None) for job in graph}
+    with pytest.raises(Exception, match="Cycle.*a, b, c"):
+        graph_jobs.add_status(graph, FakeJobLog(job_ran))
+
+
+def test_status_without_graphviz():
+    """Test status, squash and annotation don't import pygraphviz."""
+    script = f"""
+import sys
+from datetime import datetime, timezone
+sys.modules["pygraphviz"] = None  # Make any import fail.
+from git_job_log import LastRun, graph_jobs
+graph = graph_jobs.make_graph({DEPENDS!r})
+now = datetime.now(tz=timezone.utc)
+job_ran = {{job: LastRun(timestamp=now, data=None) for job in graph}}
+class FakeJobLog:
+    def last_runs(self, with_data=True):
+        return job_ran
+status = graph_jobs.add_status(graph, FakeJobLog())
+graph_jobs.annotate_graph(graph)
+graph_jobs.squash_graph(graph)
+assert all(status.values())
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def test_to_agraph():
+    """Test conversion to pygraphviz for rendering."""
+    graph = graph_jobs.make_graph(DEPENDS)
+    graph.get_node(DEPENDS[0][0]).attr["width"] = 2
+    agraph = graph.to_agraph()
+    assert sorted(agraph.nodes()) == sorted(graph)
+    assert sorted(agraph.edges()) == sorted(DEPENDS)
+    assert agraph.graph_attr["rankdir"] == "LR"
+    assert agraph.get_node(DEPENDS[0][0]).attr["width"] == "2"
+    assert agraph.get_edge(*DEPENDS[0]).attr["penwidth"] == "3"
+
+
+def test_squash_graph():
+    """Test parallel single destination children are merged deterministically."""
+    depends = [("a", f"b{i}") for i in range(5)] + [(f"b{i}", "c") for i in range(5)]
+    depends += [("a", "d"), ("d", "c"), ("d", "e"), ("x", "b3"), ("x", "y")]
+    graph = graph_jobs.make_graph(depends)
+    graph_jobs.annotate_graph(graph)
+    graph_jobs.squash_graph(graph)
+    assert sorted(graph) == ["a", "b0", "c", "d", "e", "x", "y"]
+    assert graph._label["b0"] == ["b0", "b1", "b2", "b3", "b4"]
+    assert graph.successors("x") == ["y"]
+
+
+def test_squash_graph_large():
+    """Test squashing a wide graph is fast."""
+    width = 20000
+    depends = [("root", f"mid/{i}") for i in range(width)]
+    depends += [(f"mid/{i}", f"leaf/{i % 10}") for i in range(width)]
+    graph = graph_jobs.make_graph(depends)
+    graph_jobs.annotate_graph(graph)
+    start = time.time()
+    graph_jobs.squash_graph(graph)
+    assert time.time() - start < 5
+    assert len(graph) == 1 + 10 + 10
+    assert len(graph._label["mid/0"]) == width // 10
+
+
+def test_plot_cache(tmp_path):
+    """Test make_plot() reuses renders and layouts."""
+    cache_dir = tmp_path / "cache"
+    out_path = tmp_path / "test.svg"
+    graph = graph_jobs.make_graph(DEPENDS)
+    graph_jobs.annotate_graph(graph)
+    graph_jobs.make_plot(graph, out_path, cache_dir=cache_dir)
+    (render,) = cache_dir.glob("*.svg")
+    assert render.read_text() == out_path.read_text()
+    positions = re.findall("<ellipse.*?/>", render.read_text())
+    assert len(list(cache_dir.glob("*.dot"))) == 1
+
+    # Same graph, served from cache.
+    render.write_text("cached")
+    graph_jobs.make_plot(graph, out_path, cache_dir=cache_dir)
+    assert out_path.read_text() == "cached"
+
+    # New time stamp label, drawn from the cached layout.
+    graph.graph_attr["label"] = "later"
+    graph_jobs.make_plot(graph, out_path, cache_dir=cache_dir)
+    assert ">later<" in out_path.read_text()
+    assert len(list(cache_dir.glob("*.dot"))) == 1
+
+    # New colors, drawn from the cached layout.
+    graph.get_node(DEPENDS[0][0]).attr.update(style="filled", fillcolor="#123456")
+    graph_jobs.make_plot(graph, out_path, cache_dir=cache_dir)
+    text = out_path.read_text()
+    assert "#123456" in text
+    assert [
+        re.sub(' fill="[^"]*"', "", i) for i in re.findall("<ellipse.*?/>", text)
+    ] == [re.sub(' fill="[^"]*"', "", i) for i in positions]
+    assert all(i in text for i in VERTICES)
+    assert len(list(cache_dir.glob("*.svg"))) == 3
+    assert len(list(cache_dir.glob("*.dot"))) == 1
+
+    # New structure, new layout, least recently used files pruned.
+    graph.add_edge("home/yard/lawn/mow", "home/yard/lawn/rest")
+    graph_jobs.annotate_graph(graph)
+    graph_jobs.make_plot(graph, out_path, cache_dir=cache_dir, cache_size=3)
+    assert "home/yard/lawn/rest" in out_path.read_text()
+    assert len(list(cache_dir.iterdir())) == 3  # The old layout was pruned.
+    assert len(list(cache_dir.glob("*.dot"))) == 1
+
+
+def test_neighborhood():
+    """Test k-hop neighborhoods."""
+    graph = graph_jobs.make_graph(DEPENDS)
+    graph_jobs.annotate_graph(graph)
+    near = graph_jobs.neighborhood(graph, ["home/yard/lawn/get_gas"], 1, 1)
+    assert sorted(near) == [
+        "home/yard/lawn/get_gas",
+        "home/yard/lawn/mow",
+        "home/yard/season/spring",
+        "home/yard/tools/find/gas_tank",
+    ]
+    assert len(near.edges()) == 3
+    assert near._label["home/yard/lawn/mow"] == ["home/yard/lawn/mow"]
+    down = graph_jobs.neighborhood(graph, ["home/yard/lawn/get_gas"], 0, None)
+    assert len(down) == 5
+    assert "home/yard/season/spring" not in down
+    assert len(graph) == len(VERTICES)  # Unchanged.
+
+
+def test_neighborhood_many_jobs():
+    """Test one job's upstream doesn't cut short another's downstream."""
+    graph = graph_jobs.make_graph([("P", "A"), ("A", "X"), ("X", "Y"), ("X", "B")])
+    near = graph_jobs.neighborhood(graph, ["A", "B"], 2, 2)
+    assert sorted(near) == ["A", "B", "P", "X", "Y"]
+
+
+def test_cluster_graph(random_remote, tmp_path):
+    """Test collapsing job ID prefixes."""
+    gjl = GitJobLog(random_remote)
+    gjl.log_run(i for i in VERTICES if i != "home/yard/lawn/get_gas")
+    graph = graph_jobs.make_graph(DEPENDS)
+    graph_jobs.add_status(graph, gjl)
+    graph_jobs.annotate_graph(graph)
+
+    clustered = graph_jobs.cluster_graph(graph, depth=2)
+    assert sorted(clustered) == ["home/yard/*", "work/commute/*"]
+    node = clustered.get_node("home/yard/*")
+    assert node.attr["summary"] == "1 current, 5 stale"
+    assert node.attr["fillcolor"] == FILL_BAD
+    assert clustered.get_node("work/commute/*").attr["summary"] == "2 current, 0 stale"
+    assert not clustered.edges()
+
+    expanded = graph_jobs.cluster_graph(graph, depth=2, expand=["home/yard"])
+    assert sorted(expanded) == [
+        "home/yard/lawn/*",
+        "home/yard/season/spring",
+        "home/yard/shed/organize",
+        "home/yard/tools/find/gas_tank",
+        "work/commute/*",
+    ]
+    assert sorted(expanded.edges()) == [
+        ("home/yard/lawn/*", "home/yard/tools/find/gas_tank"),
+        ("home/yard/season/spring", "home/yard/lawn/*"),
+        ("home/yard/tools/find/gas_tank", "home/yard/shed/organize"),
+    ]
+    out_path = tmp_path / "test.svg"
+    graph_jobs.make_plot(expanded, out_path)
+    if os.environ.get("GIT_JOB_LOG_SHOW_TESTS"):
+        graph_jobs.make_plot(expanded, "test6_clustered.svg")
+    assert "0 current, 3 stale" in out_path.read_text()
+
+
+def test_cluster_graph_expanded_job():
+    """Test expanding a prefix that is also a job ID."""
+    graph = graph_jobs.make_graph([("home/yard", "home/yard/lawn/mow")])
+    clustered = graph_jobs.cluster_graph(graph, 2, expand=["home/yard"])
+    assert sorted(clustered) == ["home/yard", "home/yard/lawn/mow"]
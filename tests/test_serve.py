@@ -0,0 +1,86 @@
+"""Tests for serve."""
+
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from git_job_log import GitJobLog
+from git_job_log.serve import JobLogClient, JobLogServer
+
+
+@pytest.fixture
+def server(random_remote, tmp_path):
+    """A JobLogServer on random_remote, in a thread."""
+    gjl = GitJobLog(random_remote)
+    server = JobLogServer(tmp_path / "serve.sock", gjl, sync_interval=0.2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    assert not server.path.exists()
+    shutil.rmtree(gjl.local)
+
+
+def test_serve(server):
+    """Test reading and logging through the server."""
+    client = JobLogClient(server.path)
+    assert client.last_runs() == {}
+    assert client.last_ran("a/1").timestamp is None
+    client.log_run(["a/1", "a/2"], {"v": 1})
+    assert set(client.last_runs()) == {"a/1", "a/2"}
+    assert set(client.last_runs(select=["[2-9]"])) == {"a/2"}
+    assert client.last_runs("b") == {}
+    last = client.last_ran("a/1")
+    assert last.data == {"v": 1}
+    assert last == server.gjl.last_ran("a/1")
+    with pytest.raises(Exception, match="Unknown op"):
+        client.request({"op": "nope"})
+
+
+def test_serve_reads_selected_data(server):
+    """Test only the data asked for is read, and the socket is private."""
+    assert stat.S_IMODE(server.path.stat().st_mode) == 0o600
+    client = JobLogClient(server.path)
+    client.log_run(["a/1"], {"v": 1})
+    client.log_run(["b/1"], {"v": "x" * 100})
+    expected = server.gjl.last_ran("a/1")
+    events = []
+    server.gjl.on_command = events.append
+    assert client.last_runs(with_data=False)["b/1"].data is None
+    assert "cat-file" not in [i.command for i in events]
+    assert client.last_ran("a/1") == expected
+    assert client.last_runs("a") == {"a/1": expected}
+    read = [i.stdout_bytes for i in events if i.command == "cat-file"]
+    assert read and max(read) < 100  # b/1 not read
+
+
+def test_serve_batches(server):
+    """Test concurrent log requests share commits."""
+    client = JobLogClient(server.path)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: client.log_run([f"a/{i}"], {"i": i}), range(16)))
+    assert server.gjl.push_stats["pushes"] < 16  # noqa:PLR2004
+    assert client.last_ran("a/7").data == {"i": 7}
+
+
+def test_serve_syncs(server, random_remote, tmp_path, monkeypatch):
+    """Test runs logged elsewhere show up after a background sync."""
+    client = JobLogClient(server.path)
+    assert client.last_runs() == {}
+    monkeypatch.chdir(tmp_path)  # Another local clone.
+    other = GitJobLog(random_remote)
+    assert other.local != server.gjl.local
+    other.log_run(["b/1"])
+    time.sleep(0.6)  # > sync_interval
+    assert set(client.last_runs()) == {"b/1"}
+
+
+def test_already_served(server):
+    """Test a second server can't take over a live socket."""
+    with pytest.raises(Exception, match="already being served"):
+        JobLogServer(server.path, server.gjl)
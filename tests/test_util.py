@@ -0,0 +1,30 @@
+"""Tests for util."""
+
+import random
+
+from git_job_log.util import JobMatcher, job_match
+
+# ruff: noqa: S311 - not using random for cryptography
+
+WORDS = ["home", "yard", "lawn", "mow", "ho", "h.*", "[ly]a", "", "mo$", "x"]
+
+
+def test_job_matcher():
+    """Test JobMatcher agrees with job_match()."""
+    rng = random.Random(42)
+    patterns = list(
+        {tuple(rng.choices(WORDS, k=rng.randint(0, 3))) for _ in range(200)}
+    )
+    matcher = JobMatcher(patterns)
+    for _ in range(500):
+        job = "/".join(rng.choices(WORDS, k=rng.randint(1, 5)))
+        expected = [words for words in patterns if job_match(job, words)]
+        assert matcher.match(job) == expected, job
+
+
+def test_job_matcher_offsets():
+    """Test patterns slide along the job name."""
+    matcher = JobMatcher([("yard", "la"), ("home",), ("lawn", "mow", "x")])
+    assert matcher.match("home/yard/lawn/mow") == [("yard", "la"), ("home",)]
+    assert matcher.match("work/yard/lawn") == [("yard", "la")]
+    assert matcher.match("work/lawn/mow") == []